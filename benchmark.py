@@ -0,0 +1,202 @@
+# Benchmarks for the billing app's hot paths on synthetic ledgers of 1k/10k/100k bills:
+# loading the ledger (load_data), receipt lookup, search, adding a payment, saving a new bill
+# (save_data) and building a receipt PDF, on Excel, SQLite and a local Sheets stand-in
+# (fake_sheets.py). Results go to a JSON file; --compare checks them against an earlier run.
+#
+#   python benchmark.py                                   # writes benchmark_results.json
+#   python benchmark.py --sizes 1000 10000 --repeat 3
+#   python benchmark.py --compare last_release.json       # exits 1 on a regression
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from fake_sheets import FakeSpreadsheet
+from ledger_cache import LedgerCache
+from ledger_frame import ledger_row
+from ledger_search import LedgerSearch
+from ledger_store import LedgerStore
+from receipts import build_receipt_pdf
+from sheets_storage import SheetsStorage
+from storage import ExcelStorage
+from synthetic import synthetic_ledger
+
+BACKENDS = ["excel", "sqlite", "sheets"]
+
+# Every Excel write rewrites the whole workbook, so big Excel ledgers take minutes per size
+EXCEL_MAX_ROWS = 10000
+
+# Receipt lookups timed per repeat (reported per lookup)
+LOOKUPS = 1000
+
+# Search screen queries: a name, a phone prefix, college plus reference, and a typo
+SEARCHES = ["customer 42", "90000", "college 3 ref 1", "custmer"]
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def make_storage(backend, ledger, directory):
+    if backend == "excel":
+        path = os.path.join(directory, f"ledger_{len(ledger)}.xlsx")
+        ledger.to_excel(path, index=False)
+        return ExcelStorage(path)
+    if backend == "sqlite":
+        store = LedgerStore(os.path.join(directory, f"ledger_{len(ledger)}.db"))
+        store.insert_many(ledger.to_dict("records"))
+        return store
+    return SheetsStorage(FakeSpreadsheet.from_ledger(ledger))
+
+
+def new_bill(n):
+    return {
+        "Receipt No.": f"BENCH{n}", "Customer Name": "Benchmark", "College": "College 1", "Phone No.": "9000000000",
+        "Project Title": "Benchmark", "Reference": "", "Date": datetime.date.today(), "Total Cost": 5000.0,
+        "1st Payment Amount": 0, "2nd Payment Amount": 0, "3rd Payment Amount": 0,
+        "Deduction Amount": 0, "Total Paid": 0, "Balance": 5000.0,
+    }
+
+
+def bench_backend(backend, ledger, repeat, directory):
+    storage = make_storage(backend, ledger, directory)
+    spreadsheet = getattr(storage, "spreadsheet", None)
+    receipts = ledger["Receipt No."].tolist()
+    rng = random.Random(0)
+    results = []
+
+    def record(op, times, per=1, calls_before=None):
+        result = {
+            "backend": backend, "rows": len(ledger), "op": op, "n": len(times),
+            "median_ms": statistics.median(times) / per, "min_ms": min(times) / per, "max_ms": max(times) / per,
+        }
+        if spreadsheet is not None and calls_before is not None:
+            result["api_calls"] = (spreadsheet.calls - calls_before) / len(times)
+        results.append(result)
+        print(f"  {backend:<7}{len(ledger):>8} {op:<16}{result['median_ms']:>12.4f} ms"
+              + (f"  ({result['api_calls']:.1f} API calls)" if "api_calls" in result else ""))
+
+    calls = spreadsheet.calls if spreadsheet else None
+    record("load", timed(lambda: LedgerCache(storage, ttl=3600).get(), repeat), calls_before=calls)
+
+    ledger_cache = LedgerCache(storage, ttl=3600)
+    ledger_cache.get()
+    wanted = [rng.choice(receipts) for _ in range(LOOKUPS)]
+    record("lookup", timed(lambda: [ledger_cache.index.get(receipt) for receipt in wanted], repeat), per=LOOKUPS)
+
+    record("search_index", timed(lambda: LedgerSearch.from_frame(ledger_cache.get()), repeat))
+    record("search", timed(lambda: [ledger_cache.search(query) for query in SEARCHES], repeat), per=len(SEARCHES))
+
+    # The first payment moves the slot payments into the payments table; keep that out of the timing
+    ledger_cache.add_payment(rng.choice(receipts), datetime.date.today(), 100.0, "Cash")
+    calls = spreadsheet.calls if spreadsheet else None
+    record("add_payment", timed(
+        lambda: ledger_cache.add_payment(rng.choice(receipts), datetime.date.today(), 100.0, "GPay"), repeat
+    ), calls_before=calls)
+
+    counter = iter(range(10 ** 9))
+    calls = spreadsheet.calls if spreadsheet else None
+    record("save_bill", timed(lambda: ledger_cache.insert(new_bill(next(counter))), repeat), calls_before=calls)
+    return results
+
+
+def bench_pdf(ledger, repeat):
+    row = ledger_row(ledger, 0)
+    first = timed(lambda: build_receipt_pdf(row), 1)
+    results = [{"backend": "-", "rows": 1, "op": "pdf_first", "n": 1, "median_ms": first[0], "min_ms": first[0], "max_ms": first[0]}]
+    times = timed(lambda: build_receipt_pdf(row), repeat)
+    results.append({"backend": "-", "rows": 1, "op": "pdf", "n": repeat,
+                    "median_ms": statistics.median(times), "min_ms": min(times), "max_ms": max(times)})
+    print(f"  receipt PDF: first {first[0]:.1f} ms, then {statistics.median(times):.1f} ms")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def key(result):
+    return f"{result['backend']}/{result['rows']}/{result['op']}"
+
+
+# Print median ratios against an earlier results file; True if anything got slower than threshold
+def compare(results, baseline_file, threshold):
+    with open(baseline_file) as f:
+        baseline = {key(result): result for result in json.load(f)["results"]}
+    regressed = False
+    print(f"\nAgainst {baseline_file} (regression if more than {threshold:.2f}x slower):")
+    for result in results:
+        before = baseline.get(key(result))
+        if before is None or before["median_ms"] <= 0:
+            continue
+        ratio = result["median_ms"] / before["median_ms"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"  {key(result):<28}{before['median_ms']:>12.4f} -> {result['median_ms']:>10.4f} ms  {ratio:>6.2f}x{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the billing app's load/lookup/update/save/PDF paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--excel-max-rows", type=int, default=EXCEL_MAX_ROWS)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.sizes:
+            ledger = synthetic_ledger(rows)
+            print(f"{rows} bills")
+            for backend in args.backends:
+                if backend == "excel" and rows > args.excel_max_rows:
+                    print(f"  excel   skipped above {args.excel_max_rows} rows (--excel-max-rows)")
+                    continue
+                results += bench_backend(backend, ledger, args.repeat, directory)
+        results += bench_pdf(LedgerCache(SheetsStorage(FakeSpreadsheet.from_ledger(synthetic_ledger(1))), 3600).get(),
+                             args.repeat)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
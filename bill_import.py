@@ -0,0 +1,176 @@
+# Bulk import of historical bills from a CSV or XLSX file.
+# The file is read in chunks; each chunk is coerced like a loaded ledger and checked
+# with whole-column operations, and every valid row is then saved in one batched write.
+#
+#   python bill_import.py old_ledger.xlsx            # validate and import
+#   python bill_import.py old_ledger.csv --check     # only write the error report
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from ledger_frame import to_paise
+from payments import PAYMENT_STAGES
+from storage import COLUMNS, DATE_COLUMNS, AMOUNT_COLUMNS, coerce_ledger, is_missing
+
+# Rows read and validated at a time
+IMPORT_CHUNK_ROWS = 5000
+
+# Columns an import file must have
+REQUIRED_COLUMNS = ["Receipt No.", "Total Cost"]
+
+# Largest difference (in currency units) tolerated between Balance and Total Cost - Total Paid - Deduction
+BALANCE_TOLERANCE = 0.01
+
+ERROR_COLUMNS = ["Row", "Receipt No.", "Error"]
+
+
+# Raw chunks of the file as DataFrames of unparsed values. "Row" is the line in the
+# file (the header is row 1), so the error report points at what the user sees.
+def read_chunks(source, filename, chunk_rows=IMPORT_CHUNK_ROWS):
+    if filename.lower().endswith(".csv"):
+        row = 2
+        for chunk in pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            chunk.insert(0, "Row", range(row, row + len(chunk)))
+            row += len(chunk)
+            yield chunk
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(col).strip() if col is not None else "" for col in next(rows, [])]
+        row = 2
+        while True:
+            values = [values for _, values in zip(range(chunk_rows), rows)]
+            if not values:
+                break
+            chunk = pd.DataFrame(values, columns=header)
+            chunk.insert(0, "Row", range(row, row + len(chunk)))
+            row += len(chunk)
+            yield chunk
+    finally:
+        workbook.close()
+
+
+# Receipt numbers as the ledger stores them: text, with 12.0 read from a workbook as "12"
+def receipt_numbers(values):
+    def text(value):
+        if is_missing(value):
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
+    return values.map(text)
+
+
+def blank(values):
+    return values.isna() | (values.astype(str).str.strip() == "")
+
+
+# Check one raw chunk. Returns (valid bills coerced to the ledger's shape, errors).
+# existing is the ledger's ReceiptIndex; seen collects receipt numbers from earlier
+# chunks so duplicates across chunks are caught too.
+def validate_chunk(chunk, existing, seen):
+    missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    rows = chunk["Row"].to_numpy()
+    raw = chunk.reindex(columns=COLUMNS)
+    raw["Receipt No."] = receipt_numbers(raw["Receipt No."])
+    receipts = raw["Receipt No."]
+    problems = []
+
+    def flag(mask, message):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            problems.append(pd.DataFrame({"Row": rows[mask], "Receipt No.": receipts[mask].to_numpy(), "Error": message}))
+
+    flag(receipts == "", "Receipt No. is empty")
+    flag(receipts.duplicated(keep="first") & (receipts != ""), "Receipt No. appears more than once in the file")
+    flag(receipts.isin(seen), "Receipt No. appears more than once in the file")
+    flag(receipts.isin(existing.receipts()) & (receipts != ""), "Receipt No. already exists")
+
+    for col in DATE_COLUMNS:
+        parsed = pd.to_datetime(raw[col], errors="coerce")
+        flag(parsed.isna() & ~blank(raw[col]), f"{col} is not a date")
+    for col in AMOUNT_COLUMNS:
+        parsed = pd.to_numeric(raw[col], errors="coerce")
+        flag(parsed.isna() & ~blank(raw[col]), f"{col} is not a number")
+
+    bills = coerce_ledger(raw)
+    # Old ledgers often leave the totals blank; fill them in the way the app computes them, in paise
+    slot_total = sum(to_paise(bills[f"{stage} Amount"]) for stage in PAYMENT_STAGES)
+    bills["Total Paid"] = bills["Total Paid"].where(~blank(raw["Total Paid"]), (slot_total / 100).round(2))
+    expected_balance = ((to_paise(bills["Total Cost"]) - to_paise(bills["Total Paid"])
+                         - to_paise(bills["Deduction Amount"])) / 100).round(2)
+    bills["Balance"] = bills["Balance"].where(~blank(raw["Balance"]), expected_balance)
+    flag((bills["Balance"] - expected_balance).abs() > BALANCE_TOLERANCE,
+         "Balance is not Total Cost - Total Paid - Deduction Amount")
+
+    seen.update(receipts[receipts != ""])
+    errors = pd.concat(problems, ignore_index=True) if problems else pd.DataFrame(columns=ERROR_COLUMNS)
+    valid = bills[~np.isin(rows, errors["Row"].to_numpy())]
+    return valid, errors
+
+
+# Validate a whole file against the ledger's receipt index. Returns (valid bills, error report).
+def validate_file(source, filename, existing, chunk_rows=IMPORT_CHUNK_ROWS):
+    seen = set()
+    valid, errors = [], []
+    for chunk in read_chunks(source, filename, chunk_rows):
+        chunk_valid, chunk_errors = validate_chunk(chunk, existing, seen)
+        valid.append(chunk_valid)
+        errors.append(chunk_errors)
+    valid = pd.concat(valid, ignore_index=True) if valid else coerce_ledger(pd.DataFrame(columns=COLUMNS))
+    errors = pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(columns=ERROR_COLUMNS)
+    return valid, errors.sort_values("Row", kind="stable").reset_index(drop=True)
+
+
+# Validate a file and save its valid bills through the ledger cache in one batched write.
+# Returns (number of bills imported, error report).
+def import_bills(source, filename, ledger_cache, chunk_rows=IMPORT_CHUNK_ROWS):
+    _, index = ledger_cache.snapshot()
+    valid, errors = validate_file(source, filename, index, chunk_rows)
+    if not valid.empty:
+        ledger_cache.insert_many(valid.to_dict("records"))
+    return len(valid), errors
+
+
+def main():
+    from ledger_cache import LedgerCache
+    from storage import get_storage
+
+    parser = argparse.ArgumentParser(description="Import historical bills from a CSV or XLSX file")
+    parser.add_argument("file")
+    parser.add_argument("--storage", default=os.environ.get("BILLS_STORAGE", "sqlite"), choices=["excel", "sqlite", "sheets"])
+    parser.add_argument("--check", action="store_true", help="Only validate; don't import anything")
+    parser.add_argument("--errors", default="import_errors.csv", help="Where to write the per-row error report")
+    args = parser.parse_args()
+
+    ledger_cache = LedgerCache(get_storage(args.storage), ttl=3600)
+    if args.check:
+        _, index = ledger_cache.snapshot()
+        valid, errors = validate_file(args.file, args.file, index)
+        print(f"{len(valid)} valid bill(s), {errors['Row'].nunique()} row(s) with errors")
+    else:
+        imported, errors = import_bills(args.file, args.file, ledger_cache)
+        print(f"Imported {imported} bill(s), skipped {errors['Row'].nunique()} row(s) with errors")
+    if not errors.empty:
+        errors.to_csv(args.errors, index=False)
+        print(f"Error report written to {args.errors}")
+
+    # Don't exit before a write-behind queue has sent the import
+    queue_stats = ledger_cache.storage.queue_stats()
+    while queue_stats is not None and queue_stats["depth"] > 0:
+        print(f"Waiting for {queue_stats['depth']} queued write(s)...")
+        time.sleep(2)
+        queue_stats = ledger_cache.storage.queue_stats()
+
+
+if __name__ == "__main__":
+    main()
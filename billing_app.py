@@ -0,0 +1,382 @@
+import json
+import os
+import streamlit as st
+import pandas as pd
+from bill_import import import_bills, validate_file
+from ledger_cache import LedgerCache
+from ledger_export import EXPORT_FORMATS, available_formats, export_bytes, export_file_name, export_positions
+from ledger_frame import compact_ledger, expand_ledger, ledger_row
+import metrics
+from receipt_index import ReceiptIndex
+from receipt_cache import ReceiptCache
+from receipts import render_receipts_zip
+from reports import build_reports
+from storage import COLUMNS, coerce_ledger, get_storage
+
+# How long (in seconds) a loaded ledger is reused before it is fetched again
+LEDGER_TTL_SECONDS = int(os.environ.get("LEDGER_TTL_SECONDS", 300))
+
+# File Path for Excel export
+EXCEL_FILE = os.environ.get("BILLS_EXCEL_FILE", "billing_data.xlsx")
+
+# Show the per-operation timings panel in the sidebar (BILLS_ADMIN=1)
+ADMIN_PANEL = os.environ.get("BILLS_ADMIN", "0") == "1"
+
+# Bills per page on the search screen; only that page is sent to the browser
+SEARCH_PAGE_SIZES = [25, 50, 100]
+SEARCH_RESULT_COLUMNS = ["Receipt No.", "Customer Name", "Phone No.", "College", "Project Title", "Reference",
+                         "Date", "Total Cost", "Total Paid", "Balance"]
+
+# Where rendered receipt PDFs are cached, and how much memory/disk the cache may use
+RECEIPT_CACHE_DIR = os.environ.get("RECEIPT_CACHE_DIR", ".receipt_cache")
+RECEIPT_CACHE_MEMORY_MB = int(os.environ.get("RECEIPT_CACHE_MEMORY_MB", 64))
+RECEIPT_CACHE_DISK_MB = int(os.environ.get("RECEIPT_CACHE_DISK_MB", 512))
+
+
+# One storage backend and ledger cache per process, shared by every rerun and every user session
+@st.cache_resource
+def get_ledger_cache(default_storage):
+    return LedgerCache(get_storage(default_storage), ttl=LEDGER_TTL_SECONDS)
+
+
+# One receipt PDF cache per process
+@st.cache_resource
+def get_receipt_cache():
+    return ReceiptCache(RECEIPT_CACHE_DIR, RECEIPT_CACHE_MEMORY_MB * 1024 * 1024, RECEIPT_CACHE_DISK_MB * 1024 * 1024)
+
+
+# Helper to get the (cached) ledger and its receipt index. The DataFrame is shared and in
+# the compact layout (see ledger_frame.py), so don't modify it; expand rows before showing them.
+def load_data(ledger_cache):
+    try:
+        return ledger_cache.snapshot()
+    except Exception as e:
+        st.error(f"Failed to load data from {ledger_cache.storage.name} storage: {e}")
+        return compact_ledger(coerce_ledger(pd.DataFrame(columns=COLUMNS))), ReceiptIndex()
+
+
+# Helper to find a receipt's row position, offering prefix matches when there is no exact hit
+def find_receipt(df, receipt_index, receipt_no):
+    position = receipt_index.get(receipt_no)
+    if position is None:
+        matches = receipt_index.prefix_search(receipt_no)
+        if matches:
+            receipt_no = st.selectbox("Matching Receipt Nos.", matches)
+            position = receipt_index.get(receipt_no)
+    # Bills added by another session after our snapshot aren't in df yet
+    if position is not None and position >= len(df):
+        position = None
+    return receipt_no, position
+
+
+# The billing UI. default_storage is the backend used when BILLS_STORAGE isn't set.
+def run(default_storage):
+    ledger_cache = get_ledger_cache(default_storage)
+    receipt_cache = get_receipt_cache()
+
+    # Load data on app start
+    df, receipt_index = load_data(ledger_cache)
+
+    st.title("🧾 Billing Application")
+
+    menu = st.sidebar.selectbox("Select Action", ["New Entry", "Update Payment", "Search Bills", "Download Receipt", "Batch Receipts", "Bulk Import", "Reports", "Export"])
+
+    if st.sidebar.button("🔄 Reload ledger"):
+        ledger_cache.invalidate()
+        st.rerun()
+    cache_stats = ledger_cache.stats()
+    st.sidebar.caption(
+        f"Storage: {ledger_cache.storage.name} · Ledger cache: {cache_stats['hits']} hits / "
+        f"{cache_stats['misses']} misses, {cache_stats['rows']} rows"
+    )
+    queue_stats = ledger_cache.storage.queue_stats()
+    if queue_stats is not None:
+        st.sidebar.caption(f"Write queue: {queue_stats['depth']} pending · {queue_stats['flushed']} saved")
+        if queue_stats["last_error"]:
+            st.sidebar.warning(f"Saving is retrying: {queue_stats['last_error']}")
+        if queue_stats["conflicts"]:
+            st.sidebar.warning(f"{queue_stats['conflicts']} queued edit(s) clashed with changes made elsewhere and were not saved")
+
+    if ADMIN_PANEL:
+        with st.sidebar.expander("⏱ Timings"):
+            timings = metrics.summary()
+            if timings:
+                st.dataframe(pd.DataFrame(timings), hide_index=True)
+            st.json(metrics.counters())
+            st.download_button("Download metrics JSON", json.dumps(metrics.snapshot(), indent=2),
+                               file_name="billing_metrics.json", mime="application/json")
+
+    # Export the ledger to the accountants' workbook on demand
+    if st.sidebar.button("📤 Export to Excel"):
+        ledger_cache.export_excel(EXCEL_FILE)
+        with open(EXCEL_FILE, "rb") as f:
+            st.sidebar.download_button("Download billing_data.xlsx", f.read(), file_name=os.path.basename(EXCEL_FILE),
+                                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+    if menu == "New Entry":
+        st.header("Enter New Billing Details")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            receipt_no = st.text_input("Receipt No.")
+            customer_name = st.text_input("Customer Name")
+            phone_no = st.text_input("Phone No.")
+            project_title = st.text_input("Project Title")
+            college = st.text_input("College Name")
+
+        with col2:
+            reference = st.text_input("Reference")
+            date = st.date_input("Date")
+            total_cost = st.number_input("Total Cost ($)", min_value=0.0, format="%.2f")
+
+        if st.button("Save Bill"):
+            if receipt_no.strip() == "":
+                st.error("Receipt No. cannot be empty!")
+            elif receipt_no in receipt_index or ledger_cache.lookup(receipt_no) is not None:
+                # The index is our cached copy; storage also knows bills saved since it was loaded
+                st.error("Receipt No. already exists!")
+            else:
+                new_entry = {
+                    "Receipt No.": receipt_no,
+                    "Customer Name": customer_name,
+                    "College": college,
+                    "Phone No.": phone_no,
+                    "Project Title": project_title,
+                    "Reference": reference,
+                    "Date": date,
+                    "Total Cost": total_cost,
+                    "1st Payment Date": None,
+                    "1st Payment Amount": 0,
+                    "1st Payment Method": None,
+                    "2nd Payment Date": None,
+                    "2nd Payment Amount": 0,
+                    "2nd Payment Method": None,
+                    "3rd Payment Date": None,
+                    "3rd Payment Amount": 0,
+                    "3rd Payment Method": None,
+                    "Deduction Amount": 0,
+                    "Total Paid": 0,
+                    "Balance": total_cost
+                }
+                try:
+                    ledger_cache.insert(new_entry)
+                    st.success("✅ Bill Saved Successfully!")
+                except Exception as e:
+                    st.error(f"❌ Failed to save bill: {e}")
+
+    elif menu == "Update Payment":
+        st.header("Update Payment Details")
+
+        receipt_no = st.text_input("Enter Receipt No. to Update Payment")
+
+        if receipt_no:
+            receipt_no, position = find_receipt(df, receipt_index, receipt_no)
+            if position is None:
+                st.error("No records found for this Receipt No.")
+            else:
+                st.write("### Existing Billing Details")
+                st.dataframe(expand_ledger(df.iloc[[position]]))
+
+                receipt_payments = ledger_cache.payments_for(receipt_no)
+                if not receipt_payments.empty:
+                    st.write("### Payments")
+                    st.dataframe(receipt_payments, hide_index=True)
+
+                payment_stage = st.selectbox("Select Update Stage", ["Add Payment", "Deduction Update"])
+
+                if payment_stage == "Deduction Update":
+                    deduction_amount = st.number_input("Enter Deduction Amount ($)", min_value=0.0, format="%.2f")
+
+                    if st.button("Update Deduction"):
+                        try:
+                            # Added to the row as stored at write time, so a concurrent update isn't lost
+                            ledger_cache.add_deduction(receipt_no, deduction_amount)
+                            receipt_cache.invalidate(receipt_no)
+                            st.success("✅ Deduction Updated Successfully!")
+                        except Exception as e:
+                            st.error(f"❌ Failed to update deduction: {e}")
+                else:
+                    payment_date = st.date_input("Payment Date")
+                    payment_amount = st.number_input("Enter Payment Amount ($)", min_value=0.0, format="%.2f")
+                    payment_method = st.radio("Select Payment Method:", ["GPay", "Cash"])
+
+                    if st.button("Add Payment"):
+                        try:
+                            ledger_cache.add_payment(receipt_no, payment_date, payment_amount, payment_method)
+                            receipt_cache.invalidate(receipt_no)
+                            st.success("✅ Payment Updated Successfully!")
+                        except Exception as e:
+                            st.error(f"❌ Failed to update payment: {e}")
+
+    elif menu == "Search Bills":
+        st.header("Search Bills")
+
+        # A new search starts again from the first page
+        def first_page():
+            st.session_state["search_page"] = 1
+
+        query = st.text_input("Customer name, phone no., college, project title or reference", on_change=first_page)
+        col1, col2 = st.columns(2)
+        with col1:
+            fuzzy = st.checkbox("Also match words with a typo", value=True, on_change=first_page)
+        with col2:
+            page_size = st.selectbox("Bills per page", SEARCH_PAGE_SIZES, on_change=first_page)
+
+        try:
+            ledger, positions = ledger_cache.search(query, fuzzy)
+        except Exception as e:
+            st.error(f"Search failed: {e}")
+            return
+
+        pages = max(1, -(-len(positions) // page_size))
+        if st.session_state.get("search_page", 1) > pages:
+            st.session_state["search_page"] = 1
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="search_page")
+        start = (page - 1) * page_size
+        shown = positions[start:start + page_size]
+        if len(positions) == 0:
+            st.info("No bills match this search.")
+        else:
+            st.caption(f"Showing {start + 1}–{start + len(shown)} of {len(positions)} bill(s), page {page} of {pages}")
+            st.dataframe(expand_ledger(ledger.iloc[shown])[SEARCH_RESULT_COLUMNS], hide_index=True)
+
+    elif menu == "Download Receipt":
+        st.header("Download Receipt")
+        receipt_no = st.text_input("Enter Receipt No. to Download Receipt")
+
+        terms_image = st.file_uploader("Upload Terms & Conditions Image", type=["jpg", "png"])
+
+        if receipt_no:
+            receipt_no, position = find_receipt(df, receipt_index, receipt_no)
+            if position is None:
+                st.error("No records found for this Receipt No.")
+            else:
+                pdf_bytes = receipt_cache.get_pdf(ledger_row(df, position), terms_image)
+                st.download_button("Download Receipt PDF", pdf_bytes, file_name=f"receipt_{receipt_no}.pdf", mime="application/pdf")
+
+    elif menu == "Batch Receipts":
+        st.header("Batch Receipts")
+
+        mode = st.radio("Select Receipts:", ["Date Range", "Receipt Numbers", "All with Balance Due"])
+        if mode == "Date Range":
+            col1, col2 = st.columns(2)
+            with col1:
+                start_date = st.date_input("From Date")
+            with col2:
+                end_date = st.date_input("To Date")
+            selected = df[(df["Date"] >= pd.Timestamp(start_date)) & (df["Date"] <= pd.Timestamp(end_date))]
+        elif mode == "Receipt Numbers":
+            receipt_text = st.text_area("Receipt Nos. (separated by commas, spaces or new lines)")
+            wanted = receipt_text.replace(",", " ").split()
+            positions = [receipt_index.get(receipt) for receipt in wanted]
+            missing = [receipt for receipt, position in zip(wanted, positions) if position is None or position >= len(df)]
+            if missing:
+                st.warning(f"Not found: {', '.join(missing)}")
+            selected = df.iloc[[p for p in positions if p is not None and p < len(df)]]
+        else:
+            selected = df[df["Balance"] > 0]
+
+        terms_image = st.file_uploader("Upload Terms & Conditions Image", type=["jpg", "png"])
+
+        st.write(f"{len(selected)} receipt(s) selected")
+        if len(selected) > 0 and st.button("Generate Receipts"):
+            progress_bar = st.progress(0.0, text="Rendering receipts...")
+
+            def report(done, total):
+                progress_bar.progress(done / total, text=f"Rendered {done} of {total} receipts")
+
+            archive = render_receipts_zip(
+                expand_ledger(selected).to_dict("records"),
+                terms_image.getvalue() if terms_image else None,
+                progress=report,
+            )
+            st.download_button("Download Receipts ZIP", archive, file_name="receipts.zip", mime="application/zip")
+
+    elif menu == "Bulk Import":
+        st.header("Bulk Import Bills")
+        st.write("Upload a CSV or Excel file with the ledger's column headings. "
+                 "Receipt No. and Total Cost are required; blank Total Paid and Balance are filled in.")
+
+        upload = st.file_uploader("Upload Bills File", type=["csv", "xlsx"])
+        if upload is not None:
+            # Validated once per uploaded file and ledger version, not on every rerun
+            check_key = (upload.file_id, ledger_cache.version)
+            checked = st.session_state.get("import_check")
+            if checked is None or checked[0] != check_key:
+                try:
+                    checked = (check_key, validate_file(upload, upload.name, receipt_index))
+                except Exception as e:
+                    st.error(f"❌ Could not read {upload.name}: {e}")
+                    return
+                st.session_state["import_check"] = checked
+            valid, errors = checked[1]
+
+            st.write(f"{len(valid)} bill(s) ready to import, {errors['Row'].nunique()} row(s) with errors")
+            if not errors.empty:
+                st.dataframe(errors, hide_index=True)
+                st.download_button("Download Error Report", errors.to_csv(index=False), file_name="import_errors.csv", mime="text/csv")
+
+            if len(valid) > 0 and st.button(f"Import {len(valid)} Bill(s)"):
+                try:
+                    upload.seek(0)
+                    # Validated again against the current ledger, in case bills were added meanwhile
+                    imported, skipped = import_bills(upload, upload.name, ledger_cache)
+                    st.session_state["import_result"] = (upload.file_id, imported, skipped)
+                except Exception as e:
+                    st.error(f"❌ Failed to import bills: {e}")
+
+            # Kept in the session so the result survives the rerun of the download button
+            result = st.session_state.get("import_result")
+            if result is not None and result[0] == upload.file_id:
+                _, imported, skipped = result
+                st.success(f"✅ Imported {imported} bill(s)")
+                if not skipped.empty:
+                    st.warning(f"{skipped['Row'].nunique()} row(s) were not imported because of errors")
+                    st.dataframe(skipped, hide_index=True)
+                    st.download_button("Download Skipped Rows", skipped.to_csv(index=False), file_name="import_skipped.csv", mime="text/csv")
+
+    elif menu == "Reports":
+        st.header("Reports")
+
+        try:
+            reports = ledger_cache.derived("reports", lambda ledger: build_reports(ledger, ledger_cache.payments.df))
+        except Exception as e:
+            st.error(f"Failed to build reports: {e}")
+            return
+
+        summary = reports["summary"]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Total Cost", f"${summary['Total Cost']:,.2f}")
+        col2.metric("Total Paid", f"${summary['Total Paid']:,.2f}")
+        col3.metric("Deductions", f"${summary['Deduction Amount']:,.2f}")
+        col4.metric("Outstanding", f"${summary['Balance']:,.2f}")
+
+        st.subheader("Outstanding by College")
+        st.dataframe(reports["college"])
+
+        st.subheader("Outstanding by Reference")
+        st.dataframe(reports["reference"])
+
+        st.subheader("Billing by Month")
+        st.dataframe(reports["month"])
+
+        st.subheader("Collections by Payment Method")
+        st.dataframe(reports["methods"])
+
+    elif menu == "Export":
+        st.header("Export Ledger")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input("From Date", value=None)
+        with col2:
+            end_date = st.date_input("To Date", value=None)
+        colleges = st.multiselect("Colleges (all if none are picked)", df["College"].cat.categories.tolist())
+        fmt = st.selectbox("Format", available_formats(), format_func=str.upper)
+
+        positions = export_positions(df, start_date, end_date, colleges)
+        st.write(f"{len(positions)} bill(s) selected")
+        if len(positions) > 0:
+            # Built only when clicked, chunk by chunk, on a separate thread
+            st.download_button(f"Download {fmt.upper()}", lambda: export_bytes(df, positions, fmt),
+                               file_name=export_file_name(fmt, start_date, end_date), mime=EXPORT_FORMATS[fmt])
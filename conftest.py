@@ -0,0 +1,39 @@
+# Fixtures shared by the tests: ledgers on the SQLite and fake Google Sheets backends
+# (fake_sheets.py), and loaded caches over them
+import pytest
+
+from ledger_cache import LedgerCache
+from ledger_store import LedgerStore
+from sheets_storage import SheetsStorage
+
+
+# make_store(bills) -> a SQLite ledger in tmp_path holding the given bills
+@pytest.fixture
+def make_store(tmp_path):
+    def make(bills=()):
+        store = LedgerStore(str(tmp_path / "ledger.db"))
+        for bill in bills:
+            store.insert(bill)
+        return store
+    return make
+
+
+# make_cache(storage, ttl) -> a LedgerCache that has loaded the ledger. With ttl=0 every
+# get() checks the backend; a long ttl keeps serving the rows it loaded, like a session
+# that hasn't looked in a while.
+@pytest.fixture
+def make_cache():
+    def make(storage, ttl=0):
+        cache = LedgerCache(storage, ttl=ttl)
+        cache.get()
+        return cache
+    return make
+
+
+# make_sheets_cache(spreadsheet, ttl, **options) -> a loaded cache over a fake spreadsheet;
+# options go to SheetsStorage (delta_sync, queue_file)
+@pytest.fixture
+def make_sheets_cache(make_cache):
+    def make(spreadsheet, ttl=0, **options):
+        return make_cache(SheetsStorage(spreadsheet, **options), ttl)
+    return make
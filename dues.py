@@ -0,0 +1,192 @@
+# Dues report and per-customer statements, run outside the app (e.g. from cron):
+#   - dues_report.csv: every receipt with a Balance, with its ageing from the bill Date and
+#     the last payment date, rewritten on every run
+#   - statement_<customer>.pdf: one statement of dues per customer, in the receipt layout.
+#     Only customers with a receipt whose balance changed since the last run get a new
+#     statement; customers who have paid up lose theirs. What was seen is kept in a state file.
+#
+#   python dues.py --storage sqlite --out statements           # one run
+#   python dues.py --every 6                                   # keep running, every 6 hours
+#   0 7 * * * cd /srv/bills && python dues.py --out statements # or a daily cron job
+import argparse
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from ledger_frame import expand_ledger
+from metrics import count, span
+from receipts import RECEIPT_WORKERS, TEMPLATE_VERSION, render_parallel, render_statement_chunk
+from storage import is_missing
+
+# Ageing buckets by days since the bill Date: (last day, label)
+AGEING_BUCKETS = [(30, "0-30 days"), (60, "31-60 days"), (90, "61-90 days"), (np.inf, "Over 90 days")]
+
+DUES_COLUMNS = [
+    "Customer", "Receipt No.", "Customer Name", "Phone No.", "College", "Project Title", "Date",
+    "Total Cost", "Total Paid", "Deduction Amount", "Balance",
+    "Last Payment", "Days Outstanding", "Days Since Payment", "Ageing",
+]
+
+DUES_REPORT = "dues_report.csv"
+DUES_STATE_FILE = ".dues_state.json"
+
+
+# Which statement a receipt goes on: the customer's phone digits, or their name if there's no phone
+def customer_keys(dues):
+    digits = dues["Phone No."].astype(object).fillna("").astype(str).str.replace(r"\D", "", regex=True).str[-10:]
+    names = (dues["Customer Name"].astype(object).fillna("").astype(str).str.casefold()
+             .str.replace(r"\W+", "_", regex=True).str.strip("_"))
+    keys = np.where(digits.str.len() >= 6, digits, "name_" + names)
+    return pd.Series(keys, index=dues.index).replace("name_", "unknown")
+
+
+# Latest payment date per receipt, from a payments table (PAYMENT_COLUMNS)
+def last_payment_dates(payments):
+    if payments is None or payments.empty:
+        return {}
+    dates = pd.to_datetime(payments["Date"], errors='coerce')
+    return dates.groupby(payments["Receipt No."].astype(str)).max().dropna().dt.date.to_dict()
+
+
+# Every receipt of a compact ledger with a Balance left, with its ageing as of today
+def dues_table(ledger, payments, today):
+    with span("dues.table", rows=len(ledger)):
+        dues = expand_ledger(ledger[ledger["Balance"] > 0]).reset_index(drop=True)
+        dues.insert(0, "Customer", customer_keys(dues))
+        today = pd.Timestamp(today)
+        dates = pd.to_datetime(dues["Date"], errors='coerce')
+        last_payment = pd.to_datetime(dues["Receipt No."].astype(str).map(last_payment_dates(payments)), errors='coerce')
+        dues["Last Payment"] = last_payment.dt.date.astype(object).where(last_payment.notna(), None)
+        dues["Days Outstanding"] = (today - dates).dt.days.astype("Int64")
+        dues["Days Since Payment"] = (today - last_payment.fillna(dates)).dt.days.astype("Int64")
+        edges = [-np.inf] + [last for last, _ in AGEING_BUCKETS]
+        ageing = pd.cut(dues["Days Outstanding"].astype(float), edges, labels=[label for _, label in AGEING_BUCKETS])
+        dues["Ageing"] = ageing.astype(object).where(ageing.notna(), "No date")
+        return dues.sort_values(["Customer", "Date", "Receipt No."], na_position="last")[DUES_COLUMNS]
+
+
+def statement_path(out_dir, key):
+    return os.path.join(out_dir, f"statement_{key}.pdf")
+
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def save_state(state_file, state):
+    temp_file = state_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_file, state_file)
+
+
+# What a receipt's statement line depends on, apart from the date: amounts in paise, the
+# text cells shown, and the Ageing bucket, so a bill moving to the next bucket counts as changed
+def receipt_states(dues):
+    paise = {col: (dues[col] * 100).round().astype("int64") for col in ["Total Cost", "Total Paid", "Deduction Amount", "Balance"]}
+    text = {col: dues[col].map(lambda value: None if is_missing(value) else str(value))
+            for col in ["Date", "Project Title", "Last Payment", "Ageing"]}
+    return {
+        str(receipt): [customer, *(int(paise[col].iat[i]) for col in paise), *(text[col].iat[i] for col in text)]
+        for i, (receipt, customer) in enumerate(zip(dues["Receipt No."], dues["Customer"]))
+    }
+
+
+# One run: write the dues report, then the statements of customers whose dues changed
+# since the state file was written (all of them with full=True). Returns a summary.
+def run_dues(ledger_cache, out_dir, state_file=DUES_STATE_FILE, today=None, terms_image=None,
+             workers=RECEIPT_WORKERS, full=False):
+    today = today or datetime.date.today()
+    os.makedirs(out_dir, exist_ok=True)
+    with span("dues.run") as fields:
+        ledger = ledger_cache.get()
+        dues = dues_table(ledger, ledger_cache.payments.df, today)
+        dues.to_csv(os.path.join(out_dir, DUES_REPORT), index=False)
+
+        state = load_state(state_file)
+        if full or state.get("template") != TEMPLATE_VERSION:
+            state = {}
+        previous = state.get("receipts", {})
+        current = receipt_states(dues)
+        changed = {receipt for receipt in current.keys() | previous.keys() if current.get(receipt) != previous.get(receipt)}
+        # A customer's statement changes with any of their receipts, including ones that were
+        # paid off or moved to another customer; those who owe nothing more lose theirs
+        customers = {states[receipt][0] for states in (current, previous) for receipt in changed if receipt in states}
+        paid_up = customers - set(dues["Customer"])
+        customers -= paid_up
+
+        statements = []
+        for key, rows in dues[dues["Customer"].isin(customers)].groupby("Customer", sort=True):
+            first = rows.iloc[0]
+            customer = {col: first[col] for col in ["Customer Name", "Phone No.", "College"]}
+            statements.append((key, customer, rows.to_dict("records"), today))
+        for results in render_parallel(render_statement_chunk, statements, terms_image, workers):
+            for key, pdf_bytes in results:
+                with open(statement_path(out_dir, key), "wb") as f:
+                    f.write(pdf_bytes)
+        for key in paid_up:
+            if os.path.exists(statement_path(out_dir, key)):
+                os.remove(statement_path(out_dir, key))
+        count("dues.statements", len(statements))
+
+        save_state(state_file, {"template": TEMPLATE_VERSION, "as_of": str(today), "receipts": current})
+        fields.update(receipts=len(dues), changed=len(changed), statements=len(statements))
+        return {
+            "receipts": len(dues),
+            "customers": dues["Customer"].nunique(),
+            "balance": float(dues["Balance"].sum()),
+            "ageing": dues.groupby("Ageing")["Balance"].sum().to_dict(),
+            "changed": len(changed),
+            "statements": len(statements),
+            "removed": len(paid_up),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the dues report and per-customer statements of dues")
+    parser.add_argument("--storage", default=os.environ.get("BILLS_STORAGE", "sqlite"), choices=["excel", "sqlite", "sheets"])
+    parser.add_argument("--out", default="statements", help="Directory for the report and statement PDFs")
+    parser.add_argument("--state", default=None, help=f"State file (default: <out>/{DUES_STATE_FILE})")
+    parser.add_argument("--terms-image", help="Terms & conditions image to put on every statement")
+    parser.add_argument("--workers", type=int, default=RECEIPT_WORKERS)
+    parser.add_argument("--full", action="store_true", help="Regenerate every statement, not just changed ones")
+    parser.add_argument("--today", type=datetime.date.fromisoformat, help="Date to age the dues to (YYYY-MM-DD)")
+    parser.add_argument("--every", type=float, help="Keep running, once every this many hours")
+    args = parser.parse_args()
+
+    # This job only reads; it must not replay the app's queued Sheets writes
+    os.environ["SHEETS_WRITE_BEHIND"] = "0"
+    from ledger_cache import LedgerCache
+    from storage import get_storage
+
+    terms_image = None
+    if args.terms_image:
+        with open(args.terms_image, "rb") as f:
+            terms_image = f.read()
+    # ttl=0: every run reads the ledger afresh
+    ledger_cache = LedgerCache(get_storage(args.storage), ttl=0)
+    state_file = args.state or os.path.join(args.out, DUES_STATE_FILE)
+
+    while True:
+        started = time.monotonic()
+        summary = run_dues(ledger_cache, args.out, state_file, args.today, terms_image, args.workers, args.full)
+        print(f"{datetime.datetime.now():%Y-%m-%d %H:%M} {summary['receipts']} receipt(s) of {summary['customers']} "
+              f"customer(s) owe {summary['balance']:,.2f}; {summary['changed']} changed, "
+              f"{summary['statements']} statement(s) written, {summary['removed']} removed")
+        for bucket, balance in summary["ageing"].items():
+            print(f"  {bucket:<14}{balance:>14,.2f}")
+        if args.every is None:
+            break
+        args.full = False
+        time.sleep(max(0.0, args.every * 3600 - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# Local stand-in for a gspread Spreadsheet, for benchmarks and trying the Sheets backend
+# without a live Google Sheet. Implements the worksheet calls SheetsStorage and
+# SheetsWriteQueue use, keeps every cell in memory, counts API calls and can add a fixed
+# latency per call to mimic the network:
+#
+#   storage = SheetsStorage(FakeSpreadsheet.from_ledger(df, latency=0.05))
+#
+# Formulas are only understood as far as sheets_sync.py needs: COUNTA of a column, and
+# any other formula over a range (the fingerprints) as a hash of that range's cells.
+# That hash is not the real formula; SheetsSync checks the real one against its own writes.
+import re
+import time
+
+import gspread
+import pandas as pd
+from gspread.utils import a1_to_rowcol, column_letter_to_index
+
+from storage import COLUMNS, is_missing
+
+
+def cell_value(value):
+    if is_missing(value):
+        return ""
+    if hasattr(value, "isoformat"):
+        return str(value.date()) if isinstance(value, pd.Timestamp) else str(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows=()):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = [list(row) for row in rows]
+
+    def call(self, write=False):
+        self.spreadsheet.calls += 1
+        if write:
+            self.spreadsheet.modified += 1
+        if self.spreadsheet.latency:
+            time.sleep(self.spreadsheet.latency)
+
+    def hide(self):
+        pass
+
+    # Like the API, trailing empty cells of a row are not returned
+    def row(self, row):
+        values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def get_all_records(self, **kwargs):
+        self.call()
+        if not self.rows:
+            return []
+        header = self.rows[0]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in self.rows[1:]]
+
+    def get_all_values(self, **kwargs):
+        self.call()
+        return [list(row) for row in self.rows]
+
+    def row_values(self, row, **kwargs):
+        self.call()
+        return [str(value) for value in self.row(row)]
+
+    def col_values(self, col, **kwargs):
+        self.call()
+        values = [str(row[col - 1]) if len(row) >= col else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def batch_get(self, ranges, **kwargs):
+        self.call()
+        result = []
+        for a1_range in ranges:
+            first_row, first_col, last_row, last_col = parse_range(a1_range)
+            values = []
+            for row in range(first_row, min(last_row, len(self.rows)) + 1):
+                cells = self.row(row)[first_col - 1:last_col]
+                values.append([self.spreadsheet.evaluate(value) for value in cells])
+            while values and not values[-1]:
+                values.pop()
+            result.append(values)
+        return result
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        self.call(write=True)
+        start = len(self.rows) + 1
+        self.rows += [list(row) for row in values]
+        return {"updates": {"updatedRange": f"{self.title}!A{start}:T{len(self.rows)}"}}
+
+    def batch_update(self, data, **kwargs):
+        self.call(write=True)
+        for update in data:
+            row, col = a1_to_rowcol(update["range"].split(":")[0])
+            for i, values in enumerate(update["values"]):
+                while len(self.rows) < row + i:
+                    self.rows.append([])
+                cells = self.rows[row + i - 1]
+                for j, value in enumerate(values):
+                    while len(cells) < col + j:
+                        cells.append("")
+                    cells[col + j - 1] = value
+
+
+# "A2:T501" or "A:B" as (first row, first col, last row, last col)
+def parse_range(a1_range):
+    first, _, last = a1_range.rsplit("!", 1)[-1].partition(":")
+    bounds = []
+    for cell in (first, last or first):
+        letters, digits = re.fullmatch(r"([A-Z]*)(\d*)", cell).groups()
+        bounds.append((int(digits) if digits else None, column_letter_to_index(letters) if letters else None))
+    (first_row, first_col), (last_row, last_col) = bounds
+    return first_row or 1, first_col or 1, last_row or 10 ** 9, last_col or 10 ** 9
+
+
+class FakeSpreadsheet:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        # Bumped on every write, standing in for the Drive modified time
+        self.modified = 0
+        self.worksheets = {}
+        self.sheet1 = self.add_worksheet("Sheet1", rows=1000, cols=len(COLUMNS))
+
+    # A spreadsheet whose first worksheet holds the given ledger under a COLUMNS header
+    @classmethod
+    def from_ledger(cls, df, latency=0.0):
+        spreadsheet = cls(latency)
+        df = df.reindex(columns=COLUMNS)
+        spreadsheet.sheet1.rows = [list(COLUMNS)] + [[cell_value(value) for value in row] for row in df.itertuples(index=False)]
+        return spreadsheet
+
+    def get_lastUpdateTime(self):
+        self.calls += 1
+        return f"modified-{self.modified}"
+
+    # Value of a cell as the API would give it, working out sheets_sync.py's formulas
+    def evaluate(self, value):
+        if not isinstance(value, str) or not value.startswith("="):
+            return str(value)
+        title, a1_range = re.search(r"'((?:[^']|'')+)'!([A-Z]+\d*:[A-Z]+\d*)", value).groups()
+        worksheet = self.worksheets[title.replace("''", "'")]
+        first_row, first_col, last_row, last_col = parse_range(a1_range)
+        cells = tuple(tuple(str(cell) for cell in worksheet.row(row)[first_col - 1:last_col])
+                      for row in range(first_row, min(last_row, len(worksheet.rows)) + 1))
+        if value.startswith("=COUNTA("):
+            return sum(1 for row in cells if row and row[0] != "")
+        return hash(cells) % (2 ** 52)
+
+    def worksheet(self, title):
+        if title not in self.worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        self.worksheets[title] = FakeWorksheet(self, title)
+        return self.worksheets[title]
@@ -0,0 +1,332 @@
+import random
+import threading
+import time
+
+import pandas as pd
+
+from ledger_frame import compact_ledger, concat_ledgers, ledger_row, set_cell
+from ledger_search import SEARCH_COLUMNS, LedgerSearch
+from metrics import count, span
+from payments import PaymentLedger, payments_from_slots, receipt_changes
+from receipt_index import ReceiptIndex
+from storage import COLUMNS, WriteConflict, coerce_ledger
+
+# Columns Balance is computed from. A payment or deduction update is only written if
+# these still hold what it was computed from.
+BALANCE_INPUTS = ["Total Cost", "Total Paid", "Deduction Amount"]
+
+# How many times a conflicting update is recomputed from a fresh ledger before giving up
+WRITE_RETRIES = 3
+
+# Backends that report their changes (Storage.changes()) are refreshed from those, but
+# still loaded in full this often in case something slipped past
+FULL_RELOAD_SECONDS = 3600
+
+
+# Shared in-process copy of the ledger, reused across Streamlit reruns and sessions.
+# The storage backend is only loaded again once the TTL has expired or after
+# invalidate(); writes go through insert()/update_with(), which save to the backend
+# and then patch the cached frame in place so they never force a reload.
+# The frame is kept in the compact layout of ledger_frame.py; find() and the rows
+# handed to update computations are plain (rupees, date objects).
+# If the backend can report what changed since the load, an expired copy is refreshed
+# by merging in just those rows instead (see sync()).
+class LedgerCache:
+    def __init__(self, storage, ttl, full_ttl=FULL_RELOAD_SECONDS):
+        self.storage = storage
+        self.ttl = ttl
+        self.full_ttl = full_ttl
+        self.lock = threading.RLock()
+        self.df = None
+        self.index = ReceiptIndex()
+        # Search index over the cached ledger, built on the first search after a load
+        self.search_index = None
+        self.payments = None
+        self.loaded_at = 0.0
+        self.full_loaded_at = 0.0
+        # storage.revision() as of the last refresh; a later one means our copy is off
+        self.revision = 0
+        # Bumped on every load and every write, so results derived from the ledger know when to recompute
+        self.version = 0
+        self.derived_results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def is_fresh(self):
+        return (self.df is not None and time.monotonic() - self.loaded_at < self.ttl
+                and self.storage.revision() == self.revision)
+
+    # Return the cached ledger, loading it first if it is missing or stale.
+    # The frame is shared, so callers must treat it as read-only.
+    def get(self):
+        with self.lock:
+            if self.is_fresh():
+                self.hits += 1
+                return self.df
+            self.misses += 1
+            # Taken first, so anything the backend redoes while we refresh shows up next time
+            self.revision = self.storage.revision()
+            if self.df is not None and time.monotonic() - self.full_loaded_at < self.full_ttl and self.sync():
+                self.loaded_at = time.monotonic()
+                return self.df
+            with span("ledger.load", storage=self.storage.name) as fields:
+                loaded = self.storage.load()
+                self.payments = PaymentLedger.from_storage(self.storage, loaded)
+                self.df = compact_ledger(loaded)
+                self.index = ReceiptIndex.from_frame(self.df)
+                self.search_index = None
+                fields["rows"] = len(self.df)
+            self.loaded_at = self.full_loaded_at = time.monotonic()
+            self.version += 1
+            return self.df
+
+    # Merge the rows the backend says changed since the last refresh into the cached
+    # ledger: rows we hold are patched cell by cell, by position, so a duplicated
+    # Receipt No. patches the right row; new ones are appended. False if the backend
+    # can't tell what changed, or its positions don't line up with our copy (rows
+    # moved under it), and the ledger must be loaded again.
+    def sync(self):
+        with self.lock, span("ledger.sync", storage=self.storage.name) as fields:
+            changes = self.storage.changes()
+            if changes is None:
+                return False
+            rows = changes["rows"].reset_index(drop=True)
+            positions = changes["positions"]
+            known = [i for i, position in enumerate(positions) if position < len(self.df)]
+            new = [i for i, position in enumerate(positions) if position >= len(self.df)]
+            receipts = self.df["Receipt No."]
+            if any(str(receipts.iat[positions[i]]) != str(rows.at[i, "Receipt No."]) for i in known):
+                return False
+            if [positions[i] for i in new] != list(range(len(self.df), len(self.df) + len(new))):
+                return False
+            if known:
+                # Compare in the compact layout, where equal values look the same
+                current = self.df.iloc[[positions[i] for i in known]].reset_index(drop=True)
+                fetched = compact_ledger(rows.iloc[known]).reset_index(drop=True)
+                cells = {}
+                for col in COLUMNS:
+                    old, new_values = current[col].astype(object), fetched[col].astype(object)
+                    differs = (old != new_values).fillna(True) & ~(old.isna() & new_values.isna())
+                    for i in differs[differs].index:
+                        cells.setdefault(known[i], {})[col] = rows.at[known[i], col]
+                for i, row_changes in cells.items():
+                    self.patch(rows.at[i, "Receipt No."], row_changes, positions[i])
+            if new:
+                self.extend(rows.iloc[new].to_dict("records"))
+            if changes["payments"] is not None:
+                self.payments = PaymentLedger(changes["payments"])
+                self.version += 1
+            fields["rows"] = len(rows)
+            return True
+
+    # The ledger together with its receipt index, taken under one lock so they match
+    def snapshot(self):
+        with self.lock:
+            df = self.get()
+            return df, self.index
+
+    # Result of builder(df), recomputed only when the ledger has changed since the last call
+    def derived(self, name, builder):
+        with self.lock:
+            df = self.get()
+            cached = self.derived_results.get(name)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+            result = builder(df)
+            self.derived_results[name] = (self.version, result)
+            return result
+
+    # Rows matching a search (see ledger_search.py), best matches first. Returns the
+    # ledger and the matching row positions, taken under one lock so they match;
+    # callers slice out the page they show.
+    def search(self, query, fuzzy=True):
+        with self.lock, span("ledger.search") as fields:
+            df = self.get()
+            if self.search_index is None:
+                with span("ledger.search_index", rows=len(df)):
+                    self.search_index = LedgerSearch.from_frame(df)
+            positions = self.search_index.search(query, fuzzy)
+            fields["matches"] = len(positions)
+            return df, positions
+
+    def invalidate(self):
+        with self.lock:
+            self.df = None
+            self.index = ReceiptIndex()
+            self.search_index = None
+            self.payments = None
+            self.version += 1
+
+    # One receipt's row as a plain Series, or None
+    def find(self, receipt_no):
+        with self.lock:
+            df = self.get()
+            position = self.index.get(receipt_no)
+            return None if position is None else ledger_row(df, position)
+
+    # One receipt's row as stored right now rather than as cached, or None. For checks that
+    # must see bills other sessions saved since our load, such as a new bill's Receipt No.
+    def lookup(self, receipt_no):
+        with span("ledger.lookup", storage=self.storage.name):
+            return self.storage.get(receipt_no)
+
+    # Save a new bill to storage and add it to the cached ledger
+    def insert(self, entry):
+        with self.lock, span("ledger.save_bill", storage=self.storage.name):
+            position = self.storage.insert(entry)
+            self.append(entry, position)
+
+    # Save many new bills in one batched write and add them to the cached ledger.
+    # Their slot payments also go to the payments table once there is one; before that
+    # they only join the in-memory table, which the first add_payment() carries over.
+    def insert_many(self, entries):
+        with self.lock, span("ledger.import", storage=self.storage.name, rows=len(entries)):
+            self.get()
+            position = self.storage.insert_many(entries)
+            payments = payments_from_slots(pd.DataFrame(entries, columns=COLUMNS))
+            if not payments.empty and self.payments.migrated:
+                self.storage.insert_payments(payments.to_dict("records"))
+                for payment in payments.to_dict("records"):
+                    self.payments.add(payment)
+            elif not payments.empty:
+                self.payments = PaymentLedger(pd.concat([self.payments.df, payments], ignore_index=True), migrated=False)
+            self.extend(entries, position)
+
+    # Read-modify-write of one receipt without a global lock. compute(row) returns the
+    # changes for the receipt's cached row; storage only applies them if the reads
+    # columns are unchanged (compare-and-swap on that one row). On a conflict another
+    # session wrote the receipt first, so reload, compute again and retry after a short
+    # random pause. Only reading the row and computing the changes hold the cache lock;
+    # the write itself runs without it, so a slow backend doesn't stall other sessions'
+    # reads. Returns the changes written.
+    # intent describes the change for backends that apply it later (payments.receipt_changes).
+    def update_with(self, receipt_no, compute, reads=BALANCE_INPUTS, retries=WRITE_RETRIES, intent=None):
+        with span("ledger.update", storage=self.storage.name) as fields:
+            return self._update_with(receipt_no, compute, reads, retries, intent, fields)
+
+    def _update_with(self, receipt_no, compute, reads, retries, intent, fields):
+        for attempt in range(retries + 1):
+            fields["attempts"] = attempt + 1
+            with self.lock:
+                df = self.get()
+                position = self.index.get(receipt_no)
+                if position is None:
+                    raise KeyError(f"Receipt No. {receipt_no} not found")
+                row = ledger_row(df, position)
+                changes = compute(row)
+                expected = {col: row[col] for col in reads}
+            try:
+                self.storage.update(receipt_no, changes, position, expected=expected, intent=intent)
+            except WriteConflict:
+                count("ledger.write_conflicts")
+                if attempt == retries:
+                    raise
+                self.invalidate()
+            else:
+                # The cache may have been reloaded meanwhile; patch() looks the row up again
+                self.patch(receipt_no, changes)
+                return changes
+            time.sleep(random.uniform(0.05, 0.2) * (attempt + 1))
+
+    # Add to a receipt's Deduction Amount and recompute its Balance. Returns the changes written.
+    def add_deduction(self, receipt_no, amount):
+        intent = {"deduction": float(amount)}
+        return self.update_with(receipt_no, lambda row: receipt_changes(receipt_no, row, intent, self.payments), intent=intent)
+
+    # All payments of one receipt, oldest first
+    def payments_for(self, receipt_no):
+        with self.lock:
+            self.get()
+            return self.payments.for_receipt(receipt_no).copy()
+
+    # Record one more payment for a receipt: append it to the payments table, then
+    # rewrite the receipt's slot columns, Total Paid and Balance from the new totals.
+    # The append can't conflict; the row update is retried like update_with().
+    # Returns the ledger cells that changed.
+    def add_payment(self, receipt_no, date, amount, method):
+        with span("ledger.add_payment", storage=self.storage.name):
+            return self._add_payment(receipt_no, date, amount, method)
+
+    def _add_payment(self, receipt_no, date, amount, method):
+        with self.lock:
+            self.get()
+            if self.index.get(receipt_no) is None:
+                raise KeyError(f"Receipt No. {receipt_no} not found")
+            payment = {"Receipt No.": str(receipt_no), "Date": date, "Amount": amount, "Method": method}
+            if not self.payments.migrated:
+                # First payment since the switch from slot columns: carry the old payments over
+                # too, unless another session created the payments table since we loaded
+                if not self.storage.migrate_payments(self.payments.df.to_dict("records")):
+                    self.invalidate()
+                    self.get()
+            self.storage.insert_payments([payment])
+            self.payments.add(payment)
+
+        # After a conflict the reload brings in our payment along with everyone else's
+        intent = {"payments": True}
+        return self.update_with(receipt_no, lambda row: receipt_changes(receipt_no, row, intent, self.payments), intent=intent)
+
+    def export_excel(self, excel_file):
+        self.storage.export_excel(excel_file)
+
+    # Add a freshly saved bill to the cached ledger. position is where the backend
+    # says the bill landed, if it knows.
+    def append(self, entry, position=None):
+        with self.lock:
+            if self.df is None:
+                return
+            if position is not None and position != len(self.df):
+                # Someone else added rows behind our back, so our copy is out of date
+                self.invalidate()
+                return
+            position = len(self.df)
+            new_row = compact_ledger(coerce_ledger(pd.DataFrame([entry], columns=COLUMNS)))
+            self.df = concat_ledgers(self.df, new_row)
+            self.index.add(entry["Receipt No."], position)
+            if self.search_index is not None:
+                self.search_index.add(position, entry)
+            self.version += 1
+
+    # Add freshly saved bills to the cached ledger, like append() but in one concat
+    def extend(self, entries, position=None):
+        with self.lock:
+            if self.df is None:
+                return
+            if position is not None and position != len(self.df):
+                self.invalidate()
+                return
+            position = len(self.df)
+            new_rows = compact_ledger(coerce_ledger(pd.DataFrame(entries, columns=COLUMNS)))
+            self.df = concat_ledgers(self.df, new_rows)
+            self.index.extend([entry["Receipt No."] for entry in entries], position)
+            if self.search_index is not None:
+                for offset, entry in enumerate(entries):
+                    self.search_index.add(position + offset, entry)
+            self.version += 1
+
+    # Apply the cells we just wrote for one receipt to the cached ledger, at position
+    # if given, else at the receipt's (first) row
+    def patch(self, receipt_no, changes, position=None):
+        with self.lock:
+            if self.df is None:
+                return
+            if position is None:
+                position = self.index.get(receipt_no)
+            if position is None:
+                self.invalidate()
+                return
+            # Sessions may still be reading the current frame without the lock, so write
+            # into a copy of just the changed columns and swap it in
+            df = self.df.copy(deep=False)
+            for col, value in changes.items():
+                df[col] = df[col].copy()
+                set_cell(df, position, col, value)
+            self.df = df
+            if self.search_index is not None and any(col in SEARCH_COLUMNS for col in changes):
+                self.search_index.update(position, ledger_row(self.df, position))
+            self.version += 1
+
+    def stats(self):
+        with self.lock:
+            age = time.monotonic() - self.loaded_at if self.df is not None else None
+            return {"hits": self.hits, "misses": self.misses, "rows": 0 if self.df is None else len(self.df), "age": age}
@@ -0,0 +1,147 @@
+# Filtered ledger exports for the accountants, as XLSX, CSV or Parquet.
+# Rows are picked on the cached compact ledger and expanded and written EXPORT_CHUNK_ROWS
+# at a time (write-only workbook rows, CSV lines, Parquet row groups), so an export never
+# holds more than one chunk of plain rows besides the output file itself. The command
+# line writes that file straight to disk; the app's download holds it in memory.
+#
+#   python ledger_export.py ledger_2024.xlsx --from 2024-04-01 --to 2025-03-31
+#   python ledger_export.py ledger.parquet --college "College 1" --college "College 2"
+import argparse
+import datetime
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from ledger_frame import expand_ledger
+from metrics import count, span
+from storage import COLUMNS, DATE_COLUMNS, AMOUNT_COLUMNS, is_missing
+
+# Plain rows expanded and written at a time
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# Formats this install can write; Parquet needs pyarrow
+def available_formats():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet"]
+    return list(EXPORT_FORMATS)
+
+
+# Row positions of a compact ledger with a Date in [start, end] (either may be None)
+# and, if colleges is non-empty, one of those colleges
+def export_positions(ledger, start=None, end=None, colleges=None):
+    mask = np.ones(len(ledger), dtype=bool)
+    if start is not None:
+        mask &= (ledger["Date"] >= pd.Timestamp(start)).to_numpy(dtype=bool, na_value=False)
+    if end is not None:
+        mask &= (ledger["Date"] <= pd.Timestamp(end)).to_numpy(dtype=bool, na_value=False)
+    if colleges:
+        mask &= ledger["College"].isin(list(colleges)).to_numpy(dtype=bool, na_value=False)
+    return np.flatnonzero(mask)
+
+
+# The selected rows as plain DataFrames of at most chunk_rows rows
+def export_chunks(ledger, positions, chunk_rows=EXPORT_CHUNK_ROWS):
+    for first in range(0, len(positions), chunk_rows):
+        chunk = expand_ledger(ledger.iloc[positions[first:first + chunk_rows]])
+        count("export.rows", len(chunk))
+        yield chunk
+
+
+def write_csv(chunks, f):
+    header = True
+    for chunk in chunks:
+        f.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+    if header:
+        f.write(pd.DataFrame(columns=COLUMNS).to_csv(index=False).encode("utf-8"))
+
+
+# openpyxl's write-only mode streams rows to a temporary file instead of keeping cells
+def write_xlsx(chunks, f):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(COLUMNS)
+    for chunk in chunks:
+        for row in chunk.itertuples(index=False):
+            sheet.append([None if is_missing(value) else value
+                          for value in row])
+    workbook.save(f)
+
+
+# One Parquet row group per chunk, with a fixed schema so every group matches
+def write_parquet(chunks, f):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (col, pa.date32() if col in DATE_COLUMNS else pa.float64() if col in AMOUNT_COLUMNS else pa.string())
+        for col in COLUMNS
+    ])
+    text_columns = [col for col in COLUMNS if col not in DATE_COLUMNS + AMOUNT_COLUMNS]
+    with pq.ParquetWriter(f, schema) as writer:
+        for chunk in chunks:
+            # Text cells can hold numbers (a Reference of 12 read back from a sheet)
+            chunk[text_columns] = chunk[text_columns].astype("string")
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+# Write the selected rows of a compact ledger to a binary file object
+def write_export(ledger, positions, fmt, f):
+    with span(f"export.{fmt}", rows=len(positions)):
+        WRITERS[fmt](export_chunks(ledger, positions), f)
+
+
+# The export as bytes, for a download button. Streamlit serves downloads from memory,
+# so the whole file is held there; use the command line for exports too big for that.
+def export_bytes(ledger, positions, fmt):
+    f = io.BytesIO()
+    write_export(ledger, positions, fmt, f)
+    return f.getvalue()
+
+
+def export_file_name(fmt, start=None, end=None):
+    parts = ["ledger"] + [str(day) for day in (start, end) if day is not None]
+    return "_".join(parts) + f".{fmt}"
+
+
+def main():
+    from ledger_cache import LedgerCache
+    from storage import get_storage
+
+    parser = argparse.ArgumentParser(description="Export the ledger, or part of it, as XLSX, CSV or Parquet")
+    parser.add_argument("file", help="Output file; the format comes from its extension")
+    parser.add_argument("--storage", default=os.environ.get("BILLS_STORAGE", "sqlite"), choices=["excel", "sqlite", "sheets"])
+    parser.add_argument("--from", dest="start", type=datetime.date.fromisoformat, help="First bill date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", type=datetime.date.fromisoformat, help="Last bill date (YYYY-MM-DD)")
+    parser.add_argument("--college", action="append", help="Only bills of this college (repeatable)")
+    args = parser.parse_args()
+
+    fmt = os.path.splitext(args.file)[1].lstrip(".").lower()
+    if fmt not in available_formats():
+        parser.error(f"Can't export {fmt!r} files, expected one of {available_formats()}")
+
+    ledger = LedgerCache(get_storage(args.storage), ttl=3600).get()
+    positions = export_positions(ledger, args.start, args.end, args.college)
+    with open(args.file, "wb") as f:
+        write_export(ledger, positions, fmt, f)
+    print(f"Exported {len(positions)} bill(s) to {args.file}")
+
+
+if __name__ == "__main__":
+    main()
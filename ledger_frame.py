@@ -0,0 +1,106 @@
+import datetime
+
+import pandas as pd
+
+from metrics import span
+from storage import COLUMNS, DATE_COLUMNS, AMOUNT_COLUMNS, coerce_ledger, is_missing
+
+# Compact in-memory layout of the cached ledger, shared read-only by every session:
+#   - a few distinct values repeated on every row (colleges, references, GPay/Cash) -> category
+#   - other text -> the pandas string dtype instead of Python str objects
+#   - dates -> datetime64 instead of Python date objects
+#   - amounts -> int64 paise, so sums and comparisons are exact
+# Backends still read and write the plain layout from coerce_ledger(); expand_ledger()
+# turns (a slice of) the compact frame back into it for receipts, forms and display.
+CATEGORY_COLUMNS = ["College", "Reference", "1st Payment Method", "2nd Payment Method", "3rd Payment Method"]
+TEXT_COLUMNS = [col for col in COLUMNS if col not in CATEGORY_COLUMNS + DATE_COLUMNS + AMOUNT_COLUMNS]
+
+
+def to_paise(amounts):
+    return (pd.to_numeric(amounts, errors='coerce').fillna(0.0) * 100).round().astype("int64")
+
+
+def paise_value(value):
+    if is_missing(value):
+        return 0
+    return int(round(float(value) * 100))
+
+
+# Compact copy of a ledger in the coerce_ledger() layout
+def compact_ledger(df):
+    with span("compact_ledger", rows=len(df)):
+        return _compact_ledger(df)
+
+
+def _compact_ledger(df):
+    df = df.reindex(columns=COLUMNS)
+    compact = {}
+    for col in COLUMNS:
+        if col in CATEGORY_COLUMNS:
+            compact[col] = df[col].astype(object).where(df[col].notna(), None).astype("category")
+        elif col in DATE_COLUMNS:
+            compact[col] = pd.to_datetime(df[col], errors='coerce').astype("datetime64[ns]")
+        elif col in AMOUNT_COLUMNS:
+            compact[col] = to_paise(df[col])
+        else:
+            compact[col] = df[col].astype(object).where(df[col].notna(), None).map(
+                lambda value: value if value is None else str(value)
+            ).astype("string")
+    return pd.DataFrame(compact, index=df.index)
+
+
+# The rows of a compact frame in the plain coerce_ledger() layout
+def expand_ledger(compact):
+    df = compact.copy()
+    for col in CATEGORY_COLUMNS + TEXT_COLUMNS:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    for col in AMOUNT_COLUMNS:
+        df[col] = df[col] / 100
+    return coerce_ledger(df)
+
+
+# One row of a compact frame as a plain Series
+def ledger_row(compact, position):
+    return expand_ledger(compact.iloc[[position]]).iloc[0]
+
+
+# Append compact rows, keeping the category columns categorical
+def concat_ledgers(compact, new_rows):
+    if compact.empty:
+        return new_rows
+    compact = compact.copy(deep=False)
+    new_rows = new_rows.copy(deep=False)
+    for col in CATEGORY_COLUMNS:
+        categories = compact[col].cat.categories.union(new_rows[col].cat.categories)
+        dtype = pd.CategoricalDtype(categories)
+        compact[col] = compact[col].astype(dtype)
+        new_rows[col] = new_rows[col].astype(dtype)
+    return pd.concat([compact, new_rows], ignore_index=True)
+
+
+# Write one plain value (as saved to storage) into a cell of a compact frame, in place.
+# The cached frame is shared, so LedgerCache.patch() only calls this on its own copy.
+def set_cell(compact, position, col, value):
+    row = compact.index[position]
+    if col in AMOUNT_COLUMNS:
+        compact.at[row, col] = paise_value(value)
+    elif col in DATE_COLUMNS:
+        if isinstance(value, datetime.date) or (isinstance(value, str) and value):
+            compact.at[row, col] = pd.Timestamp(value)
+        else:
+            compact.at[row, col] = pd.NaT
+    elif col in CATEGORY_COLUMNS:
+        if is_missing(value):
+            compact.at[row, col] = None
+        else:
+            value = str(value)
+            if value not in compact[col].cat.categories:
+                compact[col] = compact[col].cat.add_categories([value])
+            compact.at[row, col] = value
+    else:
+        compact.at[row, col] = None if is_missing(value) else str(value)
+
+
+# Bytes held by a frame, counting the Python objects behind object columns
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
@@ -0,0 +1,226 @@
+import bisect
+import re
+
+import numpy as np
+import pandas as pd
+
+from storage import is_missing
+
+# Columns the search screen looks in. Receipt numbers have their own index (receipt_index.py).
+SEARCH_COLUMNS = ["Customer Name", "Phone No.", "College", "Project Title", "Reference"]
+PHONE_COLUMN = "Phone No."
+
+# Query words this long or longer also match words one typo away (missing, extra,
+# swapped or wrong letter) when no indexed word starts with them
+FUZZY_MIN_LENGTH = 4
+
+# How well a row matched one query word: the whole word, the start of a word, or one typo away
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+WORD = re.compile(r"\w+")
+# "98765 43210" and "98765-43210" are one phone number
+DIGIT_GAP = re.compile(r"(?<=\d)[\s\-]+(?=\d)")
+
+
+# Phone numbers are matched on their digits, with and without the country code
+def phone_tokens(value):
+    digits = re.sub(r"\D", "", value)
+    return {digits, digits[-10:]} if digits else set()
+
+
+# Search words of one cell value
+def cell_tokens(value, col):
+    if is_missing(value):
+        return set()
+    value = str(value)
+    if col == PHONE_COLUMN:
+        return phone_tokens(value)
+    return set(WORD.findall(value.casefold()))
+
+
+def query_terms(query):
+    query = DIGIT_GAP.sub("", str(query).casefold())
+    return list(dict.fromkeys(WORD.findall(query)))
+
+
+# Every (token, position) pair of one column of a compact ledger
+def column_tokens(values, col):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Few distinct values: tokenize each category once
+        # (code -1, a missing value, picks the empty list at the end)
+        category_tokens = np.empty(len(values.cat.categories) + 1, dtype=object)
+        category_tokens[:] = [sorted(cell_tokens(value, col)) for value in values.cat.categories] + [[]]
+        codes = values.cat.codes.to_numpy()
+        pairs = pd.Series(category_tokens[codes], dtype=object).explode().dropna()
+    else:
+        present = values[values.notna()].astype(str)
+        present.index = np.flatnonzero(values.notna().to_numpy())
+        if col == PHONE_COLUMN:
+            digits = present.str.replace(r"\D", "", regex=True)
+            digits = digits[digits != ""]
+            pairs = pd.concat([digits, digits.str[-10:]])
+        else:
+            pairs = present.str.casefold().str.findall(WORD.pattern).explode().dropna()
+    return pairs.to_numpy(dtype=object), pairs.index.to_numpy(dtype=np.int64)
+
+
+# Typos are only looked for in words, not in numbers like phones and receipt references
+def has_letters(word):
+    return not word.isdigit()
+
+
+# Words that are one deletion away from the given word (plus the word itself)
+def deletions(word):
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+# Inverted index over the SEARCH_COLUMNS of the cached ledger: word -> row positions.
+# The bulk of it is built once per load in one sorted block, so every word starting
+# with a query word is one contiguous slice. Bills added or edited afterwards go to a
+# small side index and are kept up to date in place, like ReceiptIndex.
+class LedgerSearch:
+    def __init__(self, terms=(), offsets=(0,), positions=()):
+        # Sorted distinct words; the rows of terms[i] are positions[offsets[i]:offsets[i + 1]]
+        self.terms = list(terms)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.positions = np.asarray(positions, dtype=np.int64)
+        # Rows added or edited since the build: word -> positions, and their sorted words
+        self.extra = {}
+        self.extra_terms = []
+        # Edited rows whose words in the built block are out of date
+        self.stale = set()
+        self.row_tokens = {}
+        # Rows in the built block, and in all
+        self.built_rows = 0
+        self.rows = 0
+        self.fuzzy_map = None
+
+    @classmethod
+    def from_frame(cls, df):
+        tokens, positions = [], []
+        for col in SEARCH_COLUMNS:
+            col_tokens, col_positions = column_tokens(df[col], col)
+            tokens.append(col_tokens)
+            positions.append(col_positions)
+        # Number the words in sorted order, then sort and dedupe (word, row) pairs as one int64 each
+        codes, terms = pd.factorize(pd.Series(np.concatenate(tokens), dtype=object), sort=True)
+        rows = max(len(df), 1)
+        pairs = np.sort(codes.astype(np.int64) * rows + np.concatenate(positions))
+        pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]] if len(pairs) else pairs
+        offsets = np.searchsorted(pairs // rows, np.arange(len(terms) + 1))
+        search = cls(terms.tolist(), offsets, pairs % rows)
+        search.built_rows = search.rows = len(df)
+        return search
+
+    def __len__(self):
+        return self.rows
+
+    # Index one more row (a new bill), from its plain values
+    def add(self, position, row):
+        tokens = set()
+        for col in SEARCH_COLUMNS:
+            tokens |= cell_tokens(row.get(col), col)
+        for token in tokens:
+            if token not in self.extra:
+                self.extra[token] = []
+                bisect.insort(self.extra_terms, token)
+                if self.fuzzy_map is not None and has_letters(token):
+                    for key in deletions(token):
+                        self.fuzzy_map.setdefault(key, set()).add(token)
+            self.extra[token].append(position)
+        self.row_tokens[position] = tokens
+        self.rows = max(self.rows, position + 1)
+
+    # Re-index a row whose searched cells changed; row holds all of its current plain values
+    def update(self, position, row):
+        for token in self.row_tokens.pop(position, ()):
+            self.extra[token].remove(position)
+        if position < self.built_rows:
+            self.stale.add(position)
+        self.add(position, row)
+
+    # Built-block rows of the words terms[lo:hi], scored EXACT for the word itself and PREFIX otherwise
+    def block_matches(self, term, lo, hi):
+        start, end = self.offsets[lo], self.offsets[hi]
+        positions = self.positions[start:end]
+        scores = np.full(len(positions), PREFIX, dtype=np.int64)
+        if lo < hi and self.terms[lo] == term:
+            scores[:self.offsets[lo + 1] - start] = EXACT
+        if self.stale:
+            keep = ~np.isin(positions, list(self.stale))
+            positions, scores = positions[keep], scores[keep]
+        return positions, scores
+
+    def extra_matches(self, words, score_of):
+        positions = [position for word in words for position in self.extra[word]]
+        scores = [score_of(word) for word in words for _ in self.extra[word]]
+        return np.asarray(positions, dtype=np.int64), np.asarray(scores, dtype=np.int64)
+
+    @staticmethod
+    def prefix_range(terms, term):
+        return bisect.bisect_left(terms, term), bisect.bisect_left(terms, term + "\U0010ffff")
+
+    # Indexed words one typo away from term
+    def fuzzy_words(self, term):
+        if self.fuzzy_map is None:
+            self.fuzzy_map = {}
+            for word in filter(has_letters, self.terms + self.extra_terms):
+                for key in deletions(word):
+                    self.fuzzy_map.setdefault(key, set()).add(word)
+        words = set()
+        for key in deletions(term):
+            words |= self.fuzzy_map.get(key, set())
+        return sorted(word for word in words if one_edit_apart(word, term))
+
+    # Rows matching one query word, each with its best score
+    def term_matches(self, term, fuzzy):
+        lo, hi = self.prefix_range(self.terms, term)
+        extra_lo, extra_hi = self.prefix_range(self.extra_terms, term)
+        parts = [self.block_matches(term, lo, hi),
+                 self.extra_matches(self.extra_terms[extra_lo:extra_hi], lambda word: EXACT if word == term else PREFIX)]
+        if fuzzy and lo == hi and extra_lo == extra_hi and len(term) >= FUZZY_MIN_LENGTH and has_letters(term):
+            for word in self.fuzzy_words(term):
+                i = bisect.bisect_left(self.terms, word)
+                if i < len(self.terms) and self.terms[i] == word:
+                    positions, _ = self.block_matches(word, i, i + 1)
+                    parts.append((positions, np.full(len(positions), FUZZY, dtype=np.int64)))
+                if word in self.extra:
+                    parts.append(self.extra_matches([word], lambda word: FUZZY))
+        positions = np.concatenate([part[0] for part in parts])
+        scores = np.concatenate([part[1] for part in parts])
+        # Best score per row
+        order = np.lexsort((-scores, positions))
+        positions, scores = positions[order], scores[order]
+        first = np.r_[True, positions[1:] != positions[:-1]] if len(positions) else np.array([], dtype=bool)
+        return positions[first], scores[first]
+
+    # Row positions matching every word of the query, best matches first and newest first
+    # among equals. An empty query lists every row, newest first.
+    def search(self, query, fuzzy=True):
+        terms = query_terms(query)
+        if not terms:
+            return np.arange(self.rows - 1, -1, -1, dtype=np.int64)
+        positions, scores = self.term_matches(terms[0], fuzzy)
+        for term in terms[1:]:
+            if not len(positions):
+                break
+            term_positions, term_scores = self.term_matches(term, fuzzy)
+            positions, mine, theirs = np.intersect1d(positions, term_positions, assume_unique=True, return_indices=True)
+            scores = scores[mine] + term_scores[theirs]
+        return positions[np.lexsort((-positions, -scores))]
+
+
+# True if a and b differ by one inserted, deleted, replaced or swapped character
+def one_edit_apart(a, b):
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 1 or (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                                   and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
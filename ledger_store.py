@@ -0,0 +1,150 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from metrics import span
+from payments import PAYMENT_COLUMNS
+from storage import Storage, COLUMNS, AMOUNT_COLUMNS, check_expected, coerce_ledger, is_missing
+
+
+def quote(col):
+    return '"' + col.replace('"', '""') + '"'
+
+
+# Convert a single ledger value into something sqlite3 can bind
+def to_db_value(value):
+    if is_missing(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+# SQLite-backed ledger: each bill or payment is one small transaction instead of a
+# rewrite of the whole workbook. WAL journaling keeps the file consistent if the
+# app dies halfway through a write; billing_data.xlsx is produced on demand by export_excel().
+class LedgerStore(Storage):
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self.connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            cols = ", ".join(
+                f"{quote(col)} REAL" if col in AMOUNT_COLUMNS else f"{quote(col)} TEXT" for col in COLUMNS
+            )
+            conn.execute(f"CREATE TABLE IF NOT EXISTS bills (row_id INTEGER PRIMARY KEY, {cols})")
+            conn.execute('CREATE INDEX IF NOT EXISTS bills_receipt ON bills ("Receipt No.")')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS payments (payment_id INTEGER PRIMARY KEY, '
+                '"Receipt No." TEXT, "Date" TEXT, "Amount" REAL, "Method" TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS payments_receipt ON payments ("Receipt No.")')
+
+    def connect(self):
+        # A fresh connection per operation, since Streamlit runs each session in its own thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def count(self):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0]
+
+    def load(self):
+        with closing(self.connect()) as conn, span("sqlite.load"):
+            df = pd.read_sql_query(f"SELECT {', '.join(quote(col) for col in COLUMNS)} FROM bills ORDER BY row_id", conn)
+        return coerce_ledger(df)
+
+    def load_payments(self):
+        with closing(self.connect()) as conn, span("sqlite.load_payments"):
+            return pd.read_sql_query(
+                f"SELECT {', '.join(quote(col) for col in PAYMENT_COLUMNS)} FROM payments ORDER BY payment_id", conn
+            )
+
+    def insert_payments(self, payments):
+        with closing(self.connect()) as conn, conn, span("sqlite.insert_payments", rows=len(payments)):
+            self.append_payments(conn, payments)
+
+    # The check for existing payments and the carry-over are one transaction
+    def migrate_payments(self, payments):
+        with closing(self.connect()) as conn, conn, span("sqlite.migrate_payments", rows=len(payments)):
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM payments LIMIT 1").fetchone() is not None:
+                return False
+            self.append_payments(conn, payments)
+            return True
+
+    def append_payments(self, conn, payments):
+        rows = [[to_db_value(payment.get(col)) for col in PAYMENT_COLUMNS] for payment in payments]
+        placeholders = ", ".join("?" for _ in PAYMENT_COLUMNS)
+        conn.executemany(
+            f"INSERT INTO payments ({', '.join(quote(col) for col in PAYMENT_COLUMNS)}) VALUES ({placeholders})", rows
+        )
+
+    # Indexed lookup of one receipt (the first row, if the number is duplicated)
+    def get(self, receipt_no):
+        with closing(self.connect()) as conn, span("sqlite.get"):
+            df = pd.read_sql_query(
+                f'SELECT {", ".join(quote(col) for col in COLUMNS)} FROM bills WHERE "Receipt No." = ? ORDER BY row_id LIMIT 1',
+                conn, params=[str(receipt_no)],
+            )
+        return None if df.empty else coerce_ledger(df).iloc[0]
+
+    def insert(self, entry):
+        return self.insert_many([entry])
+
+    # All bills in one transaction
+    def insert_many(self, entries):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        rows = []
+        for entry in entries:
+            values = [to_db_value(entry.get(col)) for col in COLUMNS]
+            values[0] = None if values[0] is None else str(values[0])
+            rows.append(values)
+        with closing(self.connect()) as conn, conn, span("sqlite.insert", rows=len(rows)):
+            conn.executemany(f"INSERT INTO bills ({', '.join(quote(col) for col in COLUMNS)}) VALUES ({placeholders})", rows)
+            # row_ids only grow, so the new bills are the last rows of the next load()
+            return conn.execute("SELECT COUNT(*) FROM bills").fetchone()[0] - len(rows)
+
+    # Write the changed cells of one receipt (the first row, if the number is duplicated).
+    # The expected values are checked and the row written in one IMMEDIATE transaction,
+    # which holds SQLite's write lock, so no other writer can slip in between.
+    def update(self, receipt_no, changes, position=None, expected=None, intent=None):
+        assignments = ", ".join(f"{quote(col)} = ?" for col in changes)
+        values = [to_db_value(value) for value in changes.values()]
+        with closing(self.connect()) as conn, conn, span("sqlite.update"):
+            conn.execute("BEGIN IMMEDIATE")
+            current = pd.read_sql_query(
+                f'SELECT row_id, {", ".join(quote(col) for col in COLUMNS)} FROM bills '
+                f'WHERE "Receipt No." = ? ORDER BY row_id LIMIT 1',
+                conn, params=[str(receipt_no)],
+            )
+            if current.empty:
+                raise KeyError(f"Receipt No. {receipt_no} not found")
+            check_expected(coerce_ledger(current).iloc[0], receipt_no, expected)
+            conn.execute(f"UPDATE bills SET {assignments} WHERE row_id = ?", values + [int(current.at[0, "row_id"])])
+
+    # One-off migration of an existing workbook into an empty store
+    def import_excel(self, excel_file):
+        if not os.path.exists(excel_file) or self.count() > 0:
+            return 0
+        df = pd.read_excel(excel_file)
+        rows = [
+            [to_db_value(record.get(col)) for col in COLUMNS]
+            for record in df.reindex(columns=COLUMNS).to_dict("records")
+        ]
+        for row in rows:
+            row[0] = None if row[0] is None else str(row[0])
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(f"INSERT INTO bills ({', '.join(quote(col) for col in COLUMNS)}) VALUES ({placeholders})", rows)
+        return len(rows)
@@ -0,0 +1,53 @@
+# Memory report for the cached ledger: bytes of the plain layout every backend loads
+# (object dates, float amounts, Python strings) against the compact shared layout of
+# ledger_frame.py, and what that means for many Streamlit sessions. Before the ledger
+# cache, every session kept its own plain copy; now all sessions share one compact frame
+# and each only holds the rows it expands to show.
+#
+#   python memory_report.py                         # synthetic 1k / 10k / 100k bill ledgers
+#   python memory_report.py --storage sqlite        # the real ledger
+import argparse
+
+import pandas as pd
+
+from ledger_frame import compact_ledger, expand_ledger, frame_bytes
+from synthetic import synthetic_ledger
+
+
+# NaN and None both mean an empty cell; make them compare equal
+def same_missing(df):
+    df = df.reset_index(drop=True).astype(object)
+    return df.where(df.notna(), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare plain and compact ledger memory")
+    parser.add_argument("--storage", choices=["excel", "sqlite", "sheets"], help="Measure the real ledger instead")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent sessions to project for")
+    parser.add_argument("--page-rows", type=int, default=100, help="Rows each session expands to show (one search page)")
+    args = parser.parse_args()
+
+    if args.storage:
+        from storage import get_storage
+        ledgers = {"ledger": get_storage(args.storage).load()}
+    else:
+        ledgers = {f"{rows} bills": synthetic_ledger(rows) for rows in args.rows}
+
+    print(f"{'':<14}{'plain MB':>10}{'compact MB':>12}{'ratio':>8}"
+          f"{f'before, {args.sessions} sessions':>26}{'after':>10}{'per session KB':>16}")
+    for name, plain in ledgers.items():
+        compact = compact_ledger(plain)
+        plain_bytes, compact_bytes = frame_bytes(plain), frame_bytes(compact)
+        # The round trip must give back the same ledger
+        pd.testing.assert_frame_equal(same_missing(expand_ledger(compact)), same_missing(plain), check_dtype=False)
+        # Sessions share the compact frame and only hold the rows they expand to show
+        session_bytes = frame_bytes(expand_ledger(compact.iloc[:args.page_rows]))
+        after_bytes = compact_bytes + args.sessions * session_bytes
+        mb = 1024 * 1024
+        print(f"{name:<14}{plain_bytes / mb:>10.2f}{compact_bytes / mb:>12.2f}{plain_bytes / compact_bytes:>8.1f}"
+              f"{args.sessions * plain_bytes / mb:>23.1f} MB{after_bytes / mb:>7.1f} MB{session_bytes / 1024:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Recent durations kept per operation for the p50/p95 figures
+METRICS_WINDOW = 500
+
+# Write every span as one JSON line to this file ("-" for stderr), for log shipping
+METRICS_LOG = os.environ.get("BILLS_METRICS_LOG")
+
+logger = logging.getLogger("billing.metrics")
+
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=METRICS_WINDOW))
+_totals = defaultdict(lambda: [0, 0.0])  # op -> [calls, total ms] since start
+_counters = defaultdict(int)
+
+
+def configure_logging(target=METRICS_LOG):
+    if not target or logger.handlers:
+        return
+    handler = logging.StreamHandler() if target == "-" else logging.FileHandler(target)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+configure_logging()
+
+
+# Time one operation, e.g. `with span("sheets.get_all_records", rows=n):`.
+# Extra fields (and any set on the yielded dict inside the block) go to the structured log.
+@contextmanager
+def span(op, **fields):
+    start = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        with _lock:
+            _durations[op].append(ms)
+            totals = _totals[op]
+            totals[0] += 1
+            totals[1] += ms
+        if logger.isEnabledFor(logging.INFO):
+            record = {"ts": time.time(), "op": op, "ms": round(ms, 3), **fields}
+            if error:
+                record["error"] = error
+            logger.info(json.dumps(record, default=str))
+
+
+# Add to a counter, e.g. API calls or bytes sent
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+# Per-operation latencies over the recent window, slowest p95 first
+def summary():
+    with _lock:
+        recent = {op: list(durations) for op, durations in _durations.items()}
+        totals = {op: list(values) for op, values in _totals.items()}
+    rows = []
+    for op, durations in recent.items():
+        p50, p95 = np.percentile(durations, [50, 95])
+        rows.append({
+            "op": op,
+            "calls": totals[op][0],
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "max_ms": round(max(durations), 2),
+            "last_ms": round(durations[-1], 2),
+        })
+    return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+
+def counters():
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+# Everything at once, as written by the admin panel's download button
+def snapshot():
+    return {"ts": time.time(), "operations": summary(), "counters": counters()}
+
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _totals.clear()
+        _counters.clear()
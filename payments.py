@@ -0,0 +1,137 @@
+import pandas as pd
+
+# Columns of the append-only payments table: one row per payment, any number per receipt
+PAYMENT_COLUMNS = ["Receipt No.", "Date", "Amount", "Method"]
+
+# The three payment slots of the original ledger layout
+PAYMENT_STAGES = ["1st Payment", "2nd Payment", "3rd Payment"]
+SLOT_COLUMNS = [f"{stage} {field}" for stage in PAYMENT_STAGES for field in ["Date", "Amount", "Method"]]
+
+
+def coerce_payments(payments):
+    payments = payments.reindex(columns=PAYMENT_COLUMNS).reset_index(drop=True)
+    payments["Receipt No."] = payments["Receipt No."].astype(str)
+    payments["Date"] = pd.to_datetime(payments["Date"], errors='coerce').dt.date
+    payments["Amount"] = pd.to_numeric(payments["Amount"], errors='coerce').fillna(0.0)
+    payments["Method"] = payments["Method"].astype(object).where(payments["Method"].notna(), None)
+    return payments
+
+
+# Payments recorded in the 1st/2nd/3rd slot columns of a ledger, as a payments table.
+# Used for sheets that have no payments table yet. Only the first row of a duplicated
+# Receipt No. is read, since that is the row lookups and updates go to.
+def payments_from_slots(ledger):
+    ledger = ledger[~ledger["Receipt No."].astype(str).duplicated()]
+    frames = []
+    for slot, stage in enumerate(PAYMENT_STAGES):
+        frames.append(pd.DataFrame({
+            "Receipt No.": ledger["Receipt No."].astype(str).to_numpy(),
+            "Date": ledger[f"{stage} Date"].to_numpy(),
+            "Amount": pd.to_numeric(ledger[f"{stage} Amount"], errors='coerce').fillna(0.0).to_numpy(),
+            "Method": ledger[f"{stage} Method"].to_numpy(),
+            "row": range(len(ledger)),
+            "slot": slot,
+        }))
+    payments = pd.concat(frames, ignore_index=True)
+    payments = payments[payments["Amount"] != 0].sort_values(["row", "slot"], kind="stable")
+    return coerce_payments(payments)
+
+
+def join_methods(methods):
+    return "/".join(dict.fromkeys(str(m) for m in methods if m))
+
+
+# The old three-slot layout derived from a payments table, one row per receipt.
+# The 1st and 2nd slots are the first two payments; the 3rd slot holds the third
+# payment, or when there are more, their sum with the last date and all methods used,
+# so the slot amounts always add up to Total Paid. Sums are taken in paise.
+def slot_view(payments):
+    from ledger_frame import to_paise
+    payments = payments.copy()
+    payments["n"] = payments.groupby("Receipt No.", sort=False).cumcount()
+    payments["paise"] = to_paise(payments["Amount"])
+    view = pd.DataFrame(index=pd.Index(payments["Receipt No."].unique(), name="Receipt No."))
+    for slot, stage in enumerate(PAYMENT_STAGES[:2]):
+        first = payments[payments["n"] == slot].set_index("Receipt No.")
+        view[f"{stage} Date"] = first["Date"]
+        view[f"{stage} Amount"] = first["Amount"]
+        view[f"{stage} Method"] = first["Method"]
+    rest = payments[payments["n"] >= 2].groupby("Receipt No.", sort=False)
+    view["3rd Payment Date"] = rest["Date"].last()
+    view["3rd Payment Amount"] = (rest["paise"].sum() / 100).round(2)
+    view["3rd Payment Method"] = rest["Method"].agg(join_methods)
+    view["Total Paid"] = (payments.groupby("Receipt No.", sort=False)["paise"].sum() / 100).round(2)
+    for stage in PAYMENT_STAGES:
+        view[f"{stage} Amount"] = view[f"{stage} Amount"].fillna(0.0)
+    return view
+
+
+# In-memory payments table with per-receipt totals kept up to date as payments are added,
+# so Total Paid never needs a pass over every payment. Totals are int paise, so adding
+# many payments doesn't pile up float error.
+class PaymentLedger:
+    def __init__(self, payments, migrated=True):
+        # ledger_frame imports storage, which imports this module
+        from ledger_frame import to_paise
+        self.df = coerce_payments(payments)
+        # False while the payments only exist as slot columns of the ledger
+        self.migrated = migrated
+        grouped = self.df.groupby("Receipt No.", sort=False)
+        paise = to_paise(self.df["Amount"]).groupby(self.df["Receipt No."], sort=False).sum()
+        self.totals = {receipt: int(total) for receipt, total in paise.items()}
+        self.positions = {receipt: list(rows) for receipt, rows in grouped.indices.items()}
+
+    @classmethod
+    def from_storage(cls, storage, ledger):
+        payments = storage.load_payments()
+        if payments is None or payments.empty:
+            return cls(payments_from_slots(ledger), migrated=False)
+        return cls(payments)
+
+    def total_paid(self, receipt_no):
+        return round(self.totals.get(str(receipt_no), 0) / 100, 2)
+
+    def for_receipt(self, receipt_no):
+        return self.df.iloc[self.positions.get(str(receipt_no), [])]
+
+    def add(self, payment):
+        from ledger_frame import paise_value
+        payment = coerce_payments(pd.DataFrame([payment])).iloc[0].to_dict()
+        receipt_no = payment["Receipt No."]
+        position = len(self.df)
+        self.df = pd.concat([self.df, pd.DataFrame([payment], columns=PAYMENT_COLUMNS)], ignore_index=True)
+        self.positions.setdefault(receipt_no, []).append(position)
+        self.totals[receipt_no] = self.totals.get(receipt_no, 0) + paise_value(payment["Amount"])
+        self.migrated = True
+
+    # Slot columns plus Total Paid for one receipt, for writing back to the ledger row
+    def ledger_changes(self, receipt_no):
+        view = slot_view(self.for_receipt(receipt_no))
+        changes = {col: None for col in SLOT_COLUMNS}
+        changes.update({f"{stage} Amount": 0.0 for stage in PAYMENT_STAGES})
+        if not view.empty:
+            row = view.iloc[0]
+            changes.update({col: (None if pd.isna(row[col]) else row[col]) for col in SLOT_COLUMNS})
+        changes["Total Paid"] = self.total_paid(receipt_no)
+        return changes
+
+
+# Ledger changes for one receipt, worked out from its current row (plain layout) and
+# payments (a PaymentLedger). The update is described by a JSON-able intent, so a queued
+# write can be worked out again from the row it finally lands on:
+#   {"deduction": amount}  add amount to the Deduction Amount
+#   {"payments": True}     slot columns and Total Paid from the payments table
+# Balance is recomputed either way, in paise.
+def receipt_changes(receipt_no, row, intent, payments):
+    from ledger_frame import paise_value
+    changes = {}
+    deduction = paise_value(row["Deduction Amount"])
+    total_paid = paise_value(row["Total Paid"])
+    if "deduction" in intent:
+        deduction += paise_value(intent["deduction"])
+        changes["Deduction Amount"] = round(deduction / 100, 2)
+    if intent.get("payments"):
+        changes.update(payments.ledger_changes(receipt_no))
+        total_paid = paise_value(changes["Total Paid"])
+    changes["Balance"] = round((paise_value(row["Total Cost"]) - total_paid - deduction) / 100, 2)
+    return changes
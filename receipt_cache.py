@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from metrics import count
+from receipts import TEMPLATE_VERSION, build_receipt_pdf, image_bytes, image_hash
+from storage import COLUMNS, is_missing
+
+
+# Stable text form of one ledger value for hashing (so 5, 5.0 and "5.0" from different loads agree)
+def key_value(value):
+    if is_missing(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if hasattr(value, "item"):
+        return key_value(value.item())
+    return str(value)
+
+
+def receipt_token(receipt_no):
+    return hashlib.sha1(str(receipt_no).encode("utf-8")).hexdigest()[:16]
+
+
+# Rendered receipt PDFs, addressed by a hash of everything that goes into them:
+# the row's COLUMNS values, TEMPLATE_VERSION and the terms image hash. Recently used
+# PDFs stay in memory; all of them are also kept on disk so a restart doesn't re-render.
+# Both levels are bounded in bytes and evict least recently used entries first.
+class ReceiptCache:
+    def __init__(self, directory, max_memory_bytes, max_disk_bytes):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, receipt_data, terms_hash):
+        values = [key_value(receipt_data[col]) for col in COLUMNS]
+        payload = json.dumps([TEMPLATE_VERSION, terms_hash or "", values])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # Disk files are named <receipt token>-<content key>.pdf so one receipt's entries can be found
+    def path(self, receipt_no, key):
+        return os.path.join(self.directory, f"{receipt_token(receipt_no)}-{key}.pdf")
+
+    # PDF bytes for one ledger row, rendered only if no identical receipt is cached
+    def get_pdf(self, receipt_data, terms_image=None):
+        image = image_bytes(terms_image)
+        key = self.key(receipt_data, image_hash(image))
+        receipt_no = receipt_data["Receipt No."]
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                count("receipt_cache.memory_hits")
+                return entry[1]
+        path = self.path(receipt_no, key)
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            os.utime(path)
+            count("receipt_cache.disk_hits")
+            with self.lock:
+                self.disk_hits += 1
+                self.remember(key, receipt_no, pdf_bytes)
+            return pdf_bytes
+        except FileNotFoundError:
+            pass
+
+        count("receipt_cache.misses")
+        pdf_bytes = build_receipt_pdf(receipt_data, image).getvalue()
+        with self.lock:
+            self.misses += 1
+            self.remember(key, receipt_no, pdf_bytes)
+        self.write(path, pdf_bytes)
+        return pdf_bytes
+
+    def remember(self, key, receipt_no, pdf_bytes):
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key)[1])
+        self.memory[key] = (receipt_token(receipt_no), pdf_bytes)
+        self.memory_bytes += len(pdf_bytes)
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            _, (_, evicted) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def write(self, path, pdf_bytes):
+        try:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, path)
+            self.evict_disk()
+        except OSError:
+            # The disk cache is only an optimisation; the PDF is still served from memory
+            pass
+
+    def evict_disk(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    # Drop every cached PDF of one receipt, e.g. after a payment or deduction update
+    def invalidate(self, receipt_no):
+        token = receipt_token(receipt_no)
+        with self.lock:
+            for key in [key for key, (entry_token, _) in self.memory.items() if entry_token == token]:
+                self.memory_bytes -= len(self.memory.pop(key)[1])
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(token + "-"):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+            }
@@ -0,0 +1,67 @@
+import bisect
+
+from storage import is_missing
+
+
+# Receipt No. -> row position lookup for a loaded ledger.
+# Built once per load and kept up to date on insert, so finding a receipt
+# or checking for a duplicate no longer scans the whole "Receipt No." column.
+class ReceiptIndex:
+    def __init__(self, receipts=()):
+        self.positions = {}
+        for position, receipt in enumerate(receipts):
+            key = self.key(receipt)
+            if key is not None:
+                # Keep the first row, like df.index[...][0] did
+                self.positions.setdefault(key, position)
+        self.sorted_keys = sorted(self.positions)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df["Receipt No."].tolist())
+
+    @staticmethod
+    def key(receipt):
+        if is_missing(receipt):
+            return None
+        return str(receipt)
+
+    def __contains__(self, receipt):
+        return self.key(receipt) in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    # Every receipt number in the index, as a set-like view
+    def receipts(self):
+        return self.positions.keys()
+
+    # Row position of a receipt in the ledger, or None if it doesn't exist
+    def get(self, receipt):
+        return self.positions.get(self.key(receipt))
+
+    def add(self, receipt, position):
+        key = self.key(receipt)
+        if key is None or key in self.positions:
+            return
+        self.positions[key] = position
+        bisect.insort(self.sorted_keys, key)
+
+    # Add many receipts at once, numbered from start, sorting the keys only once
+    def extend(self, receipts, start):
+        for position, receipt in enumerate(receipts, start=start):
+            key = self.key(receipt)
+            if key is not None:
+                self.positions.setdefault(key, position)
+        self.sorted_keys = sorted(self.positions)
+
+    # Receipt numbers starting with the given text, in sorted order
+    def prefix_search(self, prefix, limit=20):
+        prefix = str(prefix)
+        start = bisect.bisect_left(self.sorted_keys, prefix)
+        matches = []
+        for key in self.sorted_keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+        return matches
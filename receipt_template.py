@@ -0,0 +1,192 @@
+import copy
+from io import BytesIO
+
+import pandas as pd
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.lib.styles import getSampleStyleSheet
+
+from metrics import count, span
+from storage import is_missing
+
+# Table styles shared by every receipt
+COMPANY_INFO_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER')
+])
+CUSTOMER_DETAILS_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+])
+PAYMENT_SUMMARY_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+])
+# Statement of dues: header row and total row shaded, amounts right-aligned
+DUES_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+])
+
+# Fixed multi-line terms and conditions text
+TERMS_TEXT = (
+    "1. The initial deposit amount is non-refundable.<br/>"
+    "2. Software projects require a minimum of 10 days, and hardware projects require a minimum of 15 days for completion.<br/>"
+    "3. A 50% payment is required at the start of the project for hardware projects.<br/>"
+    "4. Payments will be made according to project milestones. For example, if 30% of the project is completed, "
+        "30% of the total payment is due at that stage.<br/>"
+    "5. No project work will be delivered if there is any outstanding payment.<br/>"
+    "6. Once the project is delivered, any requested changes will be charged according to the scope of work involved.<br/>"
+    "7. The project will be delivered strictly according to the requirements specified in the registration form in advance, "
+        "and no additional features or scope will be included unless specified and agreed upon in advance.<br/>"
+    "8. If a client refers a friend, they will receive a referral discount on their own project."
+)
+
+
+# A possibly empty ledger value as table text
+def cell_text(value):
+    if is_missing(value):
+        return ""
+    return str(value)
+
+
+def format_payment(amount, method):
+    if pd.isna(amount) or amount == 0 or pd.isna(method):
+        return "$0.00"
+    return f"${amount:.2f} ({method})"
+
+
+# The parts of a receipt that are the same for every customer (styles, company header,
+# terms image and terms text), built once. render() only creates the two per-receipt
+# tables and shallow-copies the static flowables, so their parsed text and computed
+# table styles are reused while each build gets its own layout state.
+class ReceiptTemplate:
+    def __init__(self, terms_image=None):
+        styles = getSampleStyleSheet()
+
+        # Header and Company Info
+        company_info = [
+            ["Pemchip Infotech"],
+            ["10, Vaibhav Nagar Phase 3, Siva Shakthi Complex, Near VIT, Katpadi, Vellore"],
+            ["Contact: 9361286811 / 9626914437 / 8148983811"],
+            ["Email: pemchipinfotech@gmail.com | Website: pemchip.com"]
+        ]
+        company_table = Table(company_info)
+        company_table.setStyle(COMPANY_INFO_STYLE)
+        self.receipt_title = Paragraph("<b>RECEIPT</b>", styles['Title'])
+        self.statement_title = Paragraph("<b>STATEMENT OF DUES</b>", styles['Title'])
+        self.header = [
+            Spacer(1, 12),
+            company_table,
+            Spacer(1, 12),
+        ]
+
+        # Terms & Conditions Image and text
+        self.footer = [Spacer(1, 20)]
+        if terms_image:
+            img = Image(BytesIO(terms_image), width=400, height=200)
+            img._img  # decode the image now so every receipt shares it
+            self.footer.append(img)
+        self.footer += [
+            Spacer(1, 20),
+            Paragraph("<b>Thank You for Your Business!</b>", styles['Normal']),
+            Paragraph("Pemchip Infotech", styles['Normal']),
+            Paragraph("<b>Terms & Conditions:</b>", styles['Normal']),
+            Paragraph(TERMS_TEXT, styles['Normal']),
+        ]
+
+    # Build the receipt PDF for one ledger row (a Series or dict)
+    def render(self, receipt_data):
+        buffer = BytesIO()
+        pdf = SimpleDocTemplate(buffer, pagesize=letter)
+        elements = [copy.copy(flowable) for flowable in [self.receipt_title] + self.header]
+
+        # Customer Details
+        customer_details = [
+            ["Receipt No:", receipt_data["Receipt No."]],
+            ["Customer Name:", receipt_data["Customer Name"]],
+            ["College:", receipt_data["College"]],
+            ["Phone No:", receipt_data["Phone No."]],
+            ["Project Title:", receipt_data["Project Title"]],
+            ["Date:", str(receipt_data["Date"])]
+        ]
+        table = Table(customer_details, colWidths=[150, 300])
+        table.setStyle(CUSTOMER_DETAILS_STYLE)
+        elements.append(table)
+        elements.append(Spacer(1, 12))
+
+        # Payment Summary
+        payment_summary = [
+            ["Total Cost:", f"${receipt_data['Total Cost']:.2f}"],
+            ["1st Payment:", format_payment(receipt_data['1st Payment Amount'], receipt_data['1st Payment Method'])],
+            ["2nd Payment:", format_payment(receipt_data['2nd Payment Amount'], receipt_data['2nd Payment Method'])],
+            ["3rd Payment:", format_payment(receipt_data['3rd Payment Amount'], receipt_data['3rd Payment Method'])],
+            ["Total Paid:", f"${receipt_data['Total Paid']:.2f}"],
+            ["Balance:", f"${receipt_data['Balance']:.2f}"],
+            ["Deduction Amount:", f"${receipt_data['Deduction Amount']:.2f}"]
+        ]
+        table = Table(payment_summary, colWidths=[150, 300])
+        table.setStyle(PAYMENT_SUMMARY_STYLE)
+        elements.append(table)
+
+        elements += [copy.copy(flowable) for flowable in self.footer]
+
+        with span("pdf.build"):
+            pdf.build(elements)
+        count("pdf.bytes", buffer.tell())
+        buffer.seek(0)
+        return buffer
+
+    # Build a statement PDF listing every unpaid receipt of one customer.
+    # customer has "Customer Name", "Phone No." and "College"; dues are rows of the
+    # dues report (see dues.py), as of the given date.
+    def render_statement(self, customer, dues, as_of):
+        buffer = BytesIO()
+        pdf = SimpleDocTemplate(buffer, pagesize=letter)
+        elements = [copy.copy(flowable) for flowable in [self.statement_title] + self.header]
+
+        customer_details = [
+            ["Customer Name:", customer["Customer Name"]],
+            ["College:", customer["College"]],
+            ["Phone No:", customer["Phone No."]],
+            ["Statement Date:", str(as_of)],
+        ]
+        table = Table(customer_details, colWidths=[150, 300])
+        table.setStyle(CUSTOMER_DETAILS_STYLE)
+        elements.append(table)
+        elements.append(Spacer(1, 12))
+
+        rows = [["Receipt No", "Date", "Project Title", "Total Cost", "Paid", "Deduction", "Balance", "Last Payment", "Days Due"]]
+        for due in dues:
+            rows.append([
+                due["Receipt No."], cell_text(due["Date"]), cell_text(due["Project Title"])[:28],
+                f"${due['Total Cost']:.2f}", f"${due['Total Paid']:.2f}", f"${due['Deduction Amount']:.2f}",
+                f"${due['Balance']:.2f}", cell_text(due["Last Payment"]) or "-", cell_text(due["Days Outstanding"]),
+            ])
+        rows.append(["Total Due", "", "", "", "", "", f"${sum(due['Balance'] for due in dues):.2f}", "", ""])
+        table = Table(rows, repeatRows=1)
+        table.setStyle(DUES_TABLE_STYLE)
+        elements.append(table)
+
+        elements += [copy.copy(flowable) for flowable in self.footer]
+
+        with span("pdf.statement"):
+            pdf.build(elements)
+        count("pdf.bytes", buffer.tell())
+        buffer.seek(0)
+        return buffer
@@ -0,0 +1,126 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+# Number of worker processes for batch rendering (defaults to one per CPU core)
+RECEIPT_WORKERS = int(os.environ.get("RECEIPT_WORKERS", os.cpu_count() or 1))
+
+# Receipts handed to a worker at a time, so pickling overhead is paid per chunk rather than per PDF
+RECEIPT_CHUNK_SIZE = 16
+
+# Below this many receipts, starting worker processes costs more than it saves
+RECEIPT_PARALLEL_MIN = 64
+
+
+# Bump whenever the receipt layout changes, so cached PDFs of the old layout are not served
+TEMPLATE_VERSION = "1"
+
+# Cached templates, keyed by the SHA-256 of the terms image (None when there is no image)
+RECEIPT_TEMPLATE_CACHE_SIZE = 8
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+# Raw bytes of an uploaded file, bytes object or None
+def image_bytes(terms_image):
+    if not terms_image:
+        return None
+    if isinstance(terms_image, bytes):
+        return terms_image
+    if hasattr(terms_image, "getvalue"):
+        return terms_image.getvalue()
+    terms_image.seek(0)
+    return terms_image.read()
+
+
+def image_hash(image):
+    return None if image is None else hashlib.sha256(image).hexdigest()
+
+
+# The process-wide template for a given terms image, built on first use
+def get_receipt_template(terms_image=None):
+    image = image_bytes(terms_image)
+    key = image_hash(image)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            # reportlab is only imported once a receipt is actually rendered
+            from receipt_template import ReceiptTemplate
+            if len(_templates) >= RECEIPT_TEMPLATE_CACHE_SIZE:
+                _templates.pop(next(iter(_templates)))
+            template = _templates[key] = ReceiptTemplate(image)
+        return template
+
+
+# Build the receipt PDF for one ledger row
+def build_receipt_pdf(receipt_data, terms_image=None):
+    return get_receipt_template(terms_image).render(receipt_data)
+
+
+# Build a customer's statement of dues (see ReceiptTemplate.render_statement)
+def build_statement_pdf(customer, dues, as_of, terms_image=None):
+    return get_receipt_template(terms_image).render_statement(customer, dues, as_of)
+
+
+# Worker entry point: render a chunk of receipts, returning (receipt_no, pdf bytes) pairs
+def render_chunk(records, terms_image=None):
+    return [(record["Receipt No."], build_receipt_pdf(record, terms_image).getvalue()) for record in records]
+
+
+# Worker entry point: render a chunk of statements, given as (key, customer, dues, as_of)
+# tuples, returning (key, pdf bytes) pairs
+def render_statement_chunk(statements, terms_image=None):
+    return [
+        (key, build_statement_pdf(customer, dues, as_of, terms_image).getvalue())
+        for key, customer, dues, as_of in statements
+    ]
+
+
+# Run render(chunk, terms_image) over chunks of items, in worker processes when there
+# are enough items to be worth it. Yields each chunk's results as it finishes.
+def render_parallel(render, items, terms_image=None, workers=RECEIPT_WORKERS):
+    chunks = [items[i:i + RECEIPT_CHUNK_SIZE] for i in range(0, len(items), RECEIPT_CHUNK_SIZE)]
+    if workers <= 1 or len(items) < RECEIPT_PARALLEL_MIN:
+        for chunk in chunks:
+            yield render(chunk, terms_image)
+        return
+    # spawn rather than fork: the Streamlit server process is multi-threaded
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as executor:
+        futures = [executor.submit(render, chunk, terms_image) for chunk in chunks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# Render many receipts into one ZIP archive, in parallel across CPU cores.
+# records are ledger rows as dicts, terms_image is the raw image bytes (or None) and
+# progress(done, total) is called as receipts finish.
+def render_receipts_zip(records, terms_image=None, workers=RECEIPT_WORKERS, progress=None):
+    archive = BytesIO()
+    names = set()
+    done = 0
+
+    def add(results):
+        nonlocal done
+        for receipt_no, pdf_bytes in results:
+            name = f"receipt_{receipt_no}.pdf"
+            suffix = 2
+            while name in names:
+                name = f"receipt_{receipt_no}_{suffix}.pdf"
+                suffix += 1
+            names.add(name)
+            zf.writestr(name, pdf_bytes)
+        done += len(results)
+        if progress:
+            progress(done, len(records))
+
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for results in render_parallel(render_chunk, records, terms_image, workers):
+            add(results)
+
+    archive.seek(0)
+    return archive
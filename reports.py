@@ -0,0 +1,53 @@
+import pandas as pd
+
+from ledger_frame import expand_ledger
+from metrics import span
+from payments import payments_from_slots
+
+# Amount columns summed in every ledger report
+TOTAL_COLUMNS = ["Total Cost", "Total Paid", "Deduction Amount", "Balance"]
+
+
+def month_of(dates):
+    return pd.to_datetime(dates, errors="coerce").dt.to_period("M").astype(str).replace("NaT", "No Date")
+
+
+# Totals of TOTAL_COLUMNS grouped by one ledger column (e.g. "College") or by "Month" of Date.
+# df is the compact ledger, so amounts are summed exactly in paise and converted at the end.
+def ledger_totals(df, by):
+    if by == "Month":
+        keys = month_of(df["Date"])
+    else:
+        keys = df[by].astype(object).fillna("").astype(str).str.strip().replace("", "(blank)")
+    totals = df[TOTAL_COLUMNS].groupby(keys.rename(by)).sum() / 100
+    totals.insert(0, "Bills", keys.value_counts())
+    return totals.sort_values("Balance", ascending=False) if by != "Month" else totals.sort_index()
+
+
+# Amount collected per month (of the payment date) and payment method (GPay / Cash / ...),
+# from the payments table, with a Total column
+def payment_method_split(payments):
+    payments = pd.DataFrame({
+        "Month": month_of(payments["Date"]),
+        "Method": payments["Method"].fillna("").astype(str).str.strip().replace("", "Unspecified"),
+        "Amount": payments["Amount"],
+    })
+    payments = payments[payments["Amount"] != 0]
+    split = payments.pivot_table(index="Month", columns="Method", values="Amount", aggfunc="sum", fill_value=0.0)
+    split["Total"] = split.sum(axis=1)
+    return split.sort_index()
+
+
+# Every report the Reports screen shows, from the compact cached ledger (see ledger_frame.py).
+# payments is the payments table; without one, payments are read from the ledger's slot columns.
+def build_reports(df, payments=None):
+    with span("reports.build", rows=len(df)):
+        if payments is None:
+            payments = payments_from_slots(expand_ledger(df))
+        return {
+            "summary": df[TOTAL_COLUMNS].sum() / 100,
+            "college": ledger_totals(df, "College"),
+            "reference": ledger_totals(df, "Reference"),
+            "month": ledger_totals(df, "Month"),
+            "methods": payment_method_split(payments),
+        }
@@ -0,0 +1,309 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import gspread
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+from metrics import span
+from payments import PAYMENT_COLUMNS, PaymentLedger, coerce_payments, receipt_changes
+from storage import COLUMNS, WriteConflict, check_expected, coerce_ledger, same_value
+
+# Seconds the worker waits after the first queued edit so later edits join the same batch
+WRITE_BATCH_DELAY = 1.0
+
+# Exponential backoff after a failed flush (e.g. 429 quota errors): the n-th retry sleeps a
+# random time between 0 and min(WRITE_BACKOFF_MAX, WRITE_BACKOFF_BASE * 2**n) seconds
+WRITE_BACKOFF_BASE = 1.0
+WRITE_BACKOFF_MAX = 64.0
+
+
+# Write-behind queue for SheetsStorage. Writes are acknowledged as soon as they are
+# queued and written to a local JSON-lines file, so they survive a restart; a worker
+# thread sends them to the sheet in batches:
+#   - new bills become one append_rows() on the ledger,
+#   - new payments one append_rows() on the Payments worksheet,
+#   - cell updates are merged per receipt and sent as one batch_update(), after one
+#     col_values() to find the rows and one batch_get() for the compare-and-swap check.
+# An update whose expected values no longer match was computed from a row someone else
+# has written since, so it is worked out again from its intent (payments.receipt_changes)
+# and the row as it is now. Only updates without an intent are not written; they are kept
+# in the .conflicts file and counted, so they can be re-entered. Either way revision is
+# bumped, so the ledger cache reloads instead of keeping the values it was given.
+# After a failed flush or a restart, a batch may have reached the sheet without being
+# acknowledged, so bills whose Receipt No. is already in the sheet, payments whose rows
+# already follow one another in the Payments worksheet and updates whose cells already
+# hold the new values are not sent again.
+# One queue file per process: don't point two running apps at the same file.
+class SheetsWriteQueue:
+    def __init__(self, storage, path):
+        self.storage = storage
+        self.path = path
+        self.conflicts_path = os.path.splitext(path)[0] + ".conflicts.jsonl"
+        # Guards ops; held only briefly, so enqueue() never waits on the network
+        self.lock = threading.Lock()
+        self.pending = threading.Condition(self.lock)
+        # Held while a batch is sent and removed from the queue, and while the ledger is
+        # read, so a load never sees a batch both in the sheet and still queued
+        self.sheet_lock = threading.Lock()
+        self.ops = []
+        self.flushed = 0
+        self.retries = 0
+        self.conflicts = 0
+        self.last_error = None
+        # Bumped whenever the sheet ends up different from what the queued writes said
+        self.revision = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                self.ops = [json.loads(line) for line in f if line.strip()]
+        # Whether the next flush must check what already reached the sheet
+        self.verify = bool(self.ops)
+        if os.path.exists(self.conflicts_path):
+            with open(self.conflicts_path) as f:
+                self.conflicts = sum(1 for line in f if line.strip())
+        self.worker = threading.Thread(target=self.run, name="sheets-write-queue", daemon=True)
+        self.worker.start()
+
+    def enqueue(self, *ops):
+        with self.lock:
+            self.ops += ops
+            with open(self.path, "a") as f:
+                f.write("".join(json.dumps(op) + "\n" for op in ops))
+            self.pending.notify()
+
+    # Rewrite the queue file with the ops still pending
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for op in self.ops:
+                f.write(json.dumps(op) + "\n")
+        os.replace(tmp_path, self.path)
+
+    # Remove sent ops from the queue. stale: the sheet now differs from what they told the cache.
+    def done(self, ops, conflicts=(), stale=False):
+        with self.lock:
+            sent = {id(op) for op in ops}
+            self.ops = [op for op in self.ops if id(op) not in sent]
+            self.save()
+            self.flushed += len(ops) - len(conflicts)
+            if conflicts:
+                with open(self.conflicts_path, "a") as f:
+                    for op in conflicts:
+                        f.write(json.dumps(op) + "\n")
+                self.conflicts += len(conflicts)
+            if conflicts or stale:
+                self.revision += 1
+
+    def run(self):
+        attempt = 0
+        while True:
+            with self.lock:
+                while not self.ops:
+                    self.pending.wait()
+            time.sleep(WRITE_BATCH_DELAY)
+            try:
+                with span("sheets_queue.flush", ops=len(self.ops)):
+                    self.flush()
+                attempt = 0
+                self.last_error = None
+            except Exception as e:
+                self.last_error = describe_error(e)
+                self.retries += 1
+                # The request may have reached the sheet before it failed
+                self.verify = True
+                time.sleep(random.uniform(0, min(WRITE_BACKOFF_MAX, WRITE_BACKOFF_BASE * 2 ** attempt)))
+                attempt += 1
+
+    # Send everything queued so far. Each stage is removed from the queue as soon as it is
+    # written, so a failure later on never makes an earlier stage be sent twice.
+    def flush(self):
+        with self.lock:
+            ops = list(self.ops)
+
+        inserts = [op for op in ops if op["op"] == "insert"]
+        if inserts:
+            with self.sheet_lock:
+                send = inserts
+                if self.verify:
+                    stored = self.receipt_rows()
+                    send = [op for op in inserts if str(op["row"][0]) not in stored]
+                if send:
+                    from sheets_storage import appended_position
+                    response = self.storage.sheet.append_rows([op["row"] for op in send], table_range="A1")
+                    position = appended_position(response)
+                    self.storage.wrote(range(position, position + len(send)))
+                self.done(inserts, stale=len(send) < len(inserts))
+
+        payments = [op for op in ops if op["op"] == "payments"]
+        if payments:
+            with self.sheet_lock:
+                send, stale = self.unsent_payments(payments)
+                rows = [row for op in send for row in op["rows"]]
+                if rows:
+                    self.storage.get_payments_sheet(create=True).append_rows(rows, table_range="A1")
+                self.done(payments, stale=stale)
+
+        updates = [op for op in ops if op["op"] == "update"]
+        if updates:
+            with self.sheet_lock:
+                conflicts, redone = self.send_updates(updates)
+                self.done(updates, conflicts, stale=redone)
+        self.verify = False
+
+    # Receipt No. -> sheet row (the first, for a duplicated receipt), from one col_values()
+    def receipt_rows(self):
+        rows = {}
+        for row, receipt_no in enumerate(self.storage.sheet.col_values(1)[1:], start=2):
+            rows.setdefault(str(receipt_no), row)
+        return rows
+
+    # The payment ops still to send, and whether any were dropped: carried-over slot
+    # payments once the Payments worksheet has rows (another process migrated first),
+    # and, when verifying, ops already in the sheet
+    def unsent_payments(self, payments):
+        migrations = [op for op in payments if op.get("migration")]
+        if not migrations and not self.verify:
+            return payments, False
+        sheet = self.storage.get_payments_sheet()
+        stored = [] if sheet is None else payment_keys(sheet.get_all_values()[1:])
+        send = [op for op in payments if not (stored and op.get("migration"))]
+        if self.verify:
+            starts = {}
+            for i, key in enumerate(stored):
+                starts.setdefault(key, []).append(i)
+            send = [op for op in send if not self.contains(stored, starts, payment_keys(op["rows"]))]
+        return send, len(send) < len(payments)
+
+    @staticmethod
+    def contains(stored, starts, keys):
+        return any(stored[i:i + len(keys)] == keys for i in starts.get(keys[0], ())) if keys else True
+
+    # One batch_update for all queued cell updates. Returns the ops that conflicted and
+    # whether any were redone from their intent.
+    def send_updates(self, updates):
+        from sheets_storage import to_sheet_value
+        # Later edits of a receipt win; its expected values are the ones the first edit read
+        merged = OrderedDict()
+        for op in updates:
+            entry = merged.setdefault(op["receipt_no"], {"changes": {}, "expected": {}, "ops": []})
+            entry["changes"].update(op["changes"])
+            for col, value in op["expected"].items():
+                entry["expected"].setdefault(col, value)
+            entry["ops"].append(op)
+
+        sheet = self.storage.sheet
+        rows = self.receipt_rows()
+
+        conflicts = []
+        redone = False
+        payment_ledger = None
+        found = [receipt_no for receipt_no in merged if receipt_no in rows]
+        for receipt_no in merged:
+            if receipt_no not in rows:
+                conflicts += merged[receipt_no]["ops"]
+        last_col = rowcol_to_a1(1, len(COLUMNS)).rstrip("1")
+        current = sheet.batch_get([f"A{rows[r]}:{last_col}{rows[r]}" for r in found]) if found else []
+
+        data = []
+        written = []
+        for receipt_no, values in zip(found, current):
+            entry = merged[receipt_no]
+            values = (values[0] if values else [])[:len(COLUMNS)]
+            row = coerce_ledger(pd.DataFrame([values], columns=COLUMNS[:len(values)])).iloc[0]
+            changes = entry["changes"]
+            try:
+                check_expected(row, receipt_no, entry["expected"])
+            except WriteConflict:
+                if self.verify and all(same_value(row[col], value) for col, value in changes.items()):
+                    # Written by the attempt that failed
+                    continue
+                if not all(op.get("intent") for op in entry["ops"]):
+                    conflicts += entry["ops"]
+                    continue
+                if payment_ledger is None and any(op["intent"].get("payments") for op in entry["ops"]):
+                    payment_ledger = self.read_payments()
+                    if payment_ledger is None:
+                        conflicts += entry["ops"]
+                        continue
+                changes = {}
+                redone_row = row.copy()
+                for op in entry["ops"]:
+                    op_changes = receipt_changes(receipt_no, redone_row, op["intent"], payment_ledger)
+                    for col, value in op_changes.items():
+                        redone_row[col] = value
+                    changes.update(op_changes)
+                changes = {col: to_sheet_value(value) for col, value in changes.items()}
+                redone = True
+            if not all(same_value(row[col], value) for col, value in changes.items()):
+                written.append(rows[receipt_no] - 2)
+            data += [
+                {"range": rowcol_to_a1(rows[receipt_no], COLUMNS.index(col) + 1), "values": [[value]]}
+                for col, value in changes.items()
+            ]
+        if data:
+            sheet.batch_update(data)
+            self.storage.wrote(written)
+        return conflicts, redone
+
+    # The Payments worksheet as a PaymentLedger, or None if there is none
+    def read_payments(self):
+        sheet = self.storage.get_payments_sheet()
+        if sheet is None:
+            return None
+        return PaymentLedger(pd.DataFrame(sheet.get_all_records(), columns=PAYMENT_COLUMNS))
+
+    # Apply queued, not yet sent writes to a freshly loaded ledger / payments table.
+    # Without inserts, only queued cell updates are applied (to rows read by a delta sync).
+    def overlay(self, df, inserts=True):
+        with self.lock:
+            ops = list(self.ops)
+        inserts = [op["row"] for op in ops if op["op"] == "insert"] if inserts else []
+        if inserts:
+            df = pd.concat([df.astype(object), pd.DataFrame(inserts, columns=COLUMNS)], ignore_index=True)
+        updates = [op for op in ops if op["op"] == "update"]
+        if updates:
+            df = df.astype(object)
+            receipts = df["Receipt No."].astype(str)
+            for op in updates:
+                matches = df.index[receipts == op["receipt_no"]]
+                for col, value in op["changes"].items():
+                    if len(matches):
+                        df.at[matches[0], col] = value
+        return coerce_ledger(df) if inserts or updates else df
+
+    def overlay_payments(self, payments):
+        with self.lock:
+            rows = [row for op in self.ops if op["op"] == "payments" for row in op["rows"]]
+        if not rows:
+            return payments
+        queued = pd.DataFrame(rows, columns=PAYMENT_COLUMNS)
+        return queued if payments is None or payments.empty else pd.concat([payments, queued], ignore_index=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "depth": len(self.ops),
+                "flushed": self.flushed,
+                "retries": self.retries,
+                "conflicts": self.conflicts,
+                "last_error": self.last_error,
+            }
+
+
+# Payment rows in a comparable form (the API gives back text, the queue holds values)
+def payment_keys(rows):
+    if not rows:
+        return []
+    rows = [(list(row) + [""] * len(PAYMENT_COLUMNS))[:len(PAYMENT_COLUMNS)] for row in rows]
+    payments = coerce_payments(pd.DataFrame(rows, columns=PAYMENT_COLUMNS))
+    return list(zip(payments["Receipt No."], payments["Date"], payments["Amount"].round(2), payments["Method"]))
+
+
+def describe_error(e):
+    if isinstance(e, gspread.exceptions.APIError) and e.code == 429:
+        return "Sheets API quota exceeded (429), backing off"
+    return f"{type(e).__name__}: {e}"
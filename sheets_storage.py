@@ -0,0 +1,265 @@
+import threading
+
+import gspread
+import pandas as pd
+from gspread.utils import rowcol_to_a1, a1_to_rowcol
+from google.oauth2.service_account import Credentials
+
+from metrics import count, span
+from payments import PAYMENT_COLUMNS
+from sheets_queue import SheetsWriteQueue
+from sheets_sync import SheetsSync
+from storage import Storage, COLUMNS, PAYMENTS_SHEET, check_expected, coerce_ledger, same_value, is_missing
+
+# Scopes needed to read and write the shared Google Sheet
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+# Convert a single ledger value into something the Sheets API accepts
+def to_sheet_value(value):
+    if is_missing(value):
+        return ""
+    if hasattr(value, "isoformat"):
+        return str(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+# Authorized gspread clients, one per service account file for the whole process, so
+# credentials are read and the client is built once no matter how many storages use them
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service_account_file):
+    with _clients_lock:
+        client = _clients.get(service_account_file)
+        if client is None:
+            creds = Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
+            client = _clients[service_account_file] = gspread.authorize(creds)
+            client.http_client.session.hooks["response"].append(count_response)
+        return client
+
+
+# requests hook on the client's session: HTTP requests and bytes on the wire
+def count_response(response, *args, **kwargs):
+    count("sheets.http_requests")
+    count("sheets.bytes_received", len(response.content))
+    body = response.request.body
+    count("sheets.bytes_sent", len(body) if body else 0)
+    if response.status_code == 429:
+        count("sheets.rate_limited")
+    return response
+
+
+# Worksheet calls that hit the Sheets API
+SHEETS_API_METHODS = {
+    "get_all_records", "get_all_values", "row_values", "col_values", "batch_get",
+    "append_row", "append_rows", "batch_update",
+}
+
+
+# Wraps a worksheet so every API call is counted and timed as "sheets.<method>"
+class InstrumentedWorksheet:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def __getattr__(self, name):
+        attr = getattr(self.worksheet, name)
+        if name not in SHEETS_API_METHODS:
+            return attr
+
+        def call(*args, **kwargs):
+            count("sheets.api_calls")
+            with span(f"sheets.{name}"):
+                return attr(*args, **kwargs)
+        return call
+
+
+def open_spreadsheet(spreadsheet_id, service_account_file):
+    return get_client(service_account_file).open_by_key(spreadsheet_id)
+
+
+# Data row position of the first row an append_row(s) call wrote
+def appended_position(response):
+    updated_range = response["updates"]["updatedRange"].rsplit("!", 1)[-1]
+    # Row 1 of the sheet is the header, so data starts at row 2
+    return a1_to_rowcol(updated_range.split(":")[0])[0] - 2
+
+
+# The original feet.py storage: the ledger is the first worksheet of a Google Sheet.
+# New bills are appended as one row and edits patch only the changed cells.
+# With a queue_file, writes go through a SheetsWriteQueue instead: they return as soon
+# as they are queued on disk and reach the sheet in batches from a background thread.
+# With delta_sync, changes() tells the ledger cache which rows were edited in the sheet
+# since the last load, so it can refresh without reading the whole sheet (sheets_sync.py).
+class SheetsStorage(Storage):
+    name = "sheets"
+
+    # spreadsheet is an opened gspread Spreadsheet (see open_spreadsheet), or a stand-in with
+    # the same methods such as fake_sheets.FakeSpreadsheet
+    def __init__(self, spreadsheet, queue_file=None, delta_sync=False):
+        self.spreadsheet = spreadsheet
+        self.sheet = InstrumentedWorksheet(self.spreadsheet.sheet1)  # Use .worksheet("Sheet1") if needed
+        self.payments_sheet = None
+        self.queue = SheetsWriteQueue(self, queue_file) if queue_file else None
+        self.sync = SheetsSync(self) if delta_sync else None
+
+    def load(self):
+        if self.queue is None:
+            if self.sync is not None:
+                self.sync.checkpoint()
+            return self.read_ledger()
+        with self.queue.sheet_lock:
+            if self.sync is not None:
+                self.sync.checkpoint()
+            return self.queue.overlay(self.read_ledger())
+
+    # One receipt's row in two calls (its Receipt No. column, then the row) instead of a
+    # full load, with queued writes applied
+    def get(self, receipt_no):
+        if self.queue is None:
+            return self.read_row(receipt_no)
+        with self.queue.sheet_lock:
+            df = self.queue.overlay(self.read_row(receipt_no, frame=True))
+        matches = df[df["Receipt No."].astype(str) == str(receipt_no)]
+        return None if matches.empty else matches.iloc[0]
+
+    def read_row(self, receipt_no, frame=False):
+        receipts = self.sheet.col_values(1)[1:]
+        df = pd.DataFrame(columns=COLUMNS)
+        if str(receipt_no) in receipts:
+            values = self.sheet.row_values(receipts.index(str(receipt_no)) + 2)[:len(COLUMNS)]
+            df = pd.DataFrame([values], columns=COLUMNS[:len(values)])
+        df = coerce_ledger(df)
+        if frame:
+            return df
+        return None if df.empty else df.iloc[0]
+
+    # Tell delta sync which ledger rows we changed, so it can check the fingerprints saw it
+    def wrote(self, positions):
+        if self.sync is not None:
+            self.sync.wrote(positions)
+
+    def read_ledger(self):
+        df = coerce_ledger(pd.DataFrame(self.sheet.get_all_records(), columns=COLUMNS))
+        if self.sync is not None:
+            self.sync.loaded(df)
+        return df
+
+    # Rows edited or added in the sheet since the last load, with queued writes applied
+    def changes(self):
+        if self.sync is None:
+            return None
+        if self.queue is None:
+            return self.sync.changes()
+        with self.queue.sheet_lock:
+            changes = self.sync.changes()
+            if changes is None:
+                return None
+            changes["rows"] = self.queue.overlay(changes["rows"], inserts=False)
+            if changes["payments"] is not None:
+                changes["payments"] = self.queue.overlay_payments(changes["payments"])
+            return changes
+
+    # The "Payments" worksheet, optionally creating it (with its header row) if it doesn't exist
+    def get_payments_sheet(self, create=False):
+        if self.payments_sheet is None:
+            try:
+                self.payments_sheet = InstrumentedWorksheet(self.spreadsheet.worksheet(PAYMENTS_SHEET))
+            except gspread.WorksheetNotFound:
+                if not create:
+                    return None
+                self.payments_sheet = InstrumentedWorksheet(
+                    self.spreadsheet.add_worksheet(PAYMENTS_SHEET, rows=1000, cols=len(PAYMENT_COLUMNS))
+                )
+                self.payments_sheet.append_row(PAYMENT_COLUMNS)
+        return self.payments_sheet
+
+    def load_payments(self):
+        if self.queue is None:
+            return self.read_payments()
+        with self.queue.sheet_lock:
+            return self.queue.overlay_payments(self.read_payments())
+
+    def read_payments(self):
+        payments_sheet = self.get_payments_sheet()
+        if payments_sheet is None:
+            return None
+        payments = pd.DataFrame(payments_sheet.get_all_records(), columns=PAYMENT_COLUMNS)
+        if self.sync is not None:
+            self.sync.loaded_payments(payments)
+        return payments
+
+    def insert_payments(self, payments, migration=False):
+        rows = [[to_sheet_value(payment.get(col)) for col in PAYMENT_COLUMNS] for payment in payments]
+        if self.queue is not None:
+            self.queue.enqueue({"op": "payments", "rows": rows, "migration": migration})
+            return
+        self.get_payments_sheet(create=True).append_rows(rows, table_range="A1")
+
+    # Queued, the carried-over rows are dropped at send time if the Payments worksheet
+    # has rows by then, i.e. another process migrated first
+    def migrate_payments(self, payments):
+        if self.queue is None:
+            return super().migrate_payments(payments)
+        self.insert_payments(payments, migration=True)
+        return True
+
+    def insert(self, entry):
+        row = [to_sheet_value(entry.get(col)) for col in COLUMNS]
+        if self.queue is not None:
+            # Where the row lands is only known once the queue sends it
+            self.queue.enqueue({"op": "insert", "row": row})
+            return None
+        position = appended_position(self.sheet.append_row(row, table_range="A1"))
+        self.wrote([position])
+        return position
+
+    # One append_rows call (or one queue file write) for all the bills
+    def insert_many(self, entries):
+        rows = [[to_sheet_value(entry.get(col)) for col in COLUMNS] for entry in entries]
+        if self.queue is not None:
+            self.queue.enqueue(*[{"op": "insert", "row": row} for row in rows])
+            return None
+        position = appended_position(self.sheet.append_rows(rows, table_range="A1"))
+        self.wrote(range(position, position + len(rows)))
+        return position
+
+    # The Sheets API has no conditional write, so the row is re-read (one call) and
+    # checked against the expected values right before the cells are written.
+    # Queued updates are checked the same way when the queue sends them, and redone
+    # from their intent against the row as it is then if the check fails.
+    def update(self, receipt_no, changes, position=None, expected=None, intent=None):
+        if self.queue is not None:
+            self.queue.enqueue({
+                "op": "update",
+                "receipt_no": str(receipt_no),
+                "changes": {col: to_sheet_value(value) for col, value in changes.items()},
+                "expected": {col: to_sheet_value(value) for col, value in (expected or {}).items()},
+                "intent": intent,
+            })
+            return
+        if position is None:
+            raise KeyError(f"Receipt No. {receipt_no} is not in the loaded ledger")
+        row = position + 2
+        current = self.sheet.row_values(row)
+        current = coerce_ledger(pd.DataFrame([current[:len(COLUMNS)]], columns=COLUMNS[:len(current)])).iloc[0]
+        check_expected(current, receipt_no, expected)
+        data = [
+            {"range": rowcol_to_a1(row, COLUMNS.index(col) + 1), "values": [[to_sheet_value(value)]]}
+            for col, value in changes.items()
+        ]
+        self.sheet.batch_update(data)
+        if not all(same_value(current[col], value) for col, value in changes.items()):
+            self.wrote([position])
+
+    def revision(self):
+        return 0 if self.queue is None else self.queue.revision
+
+    def queue_stats(self):
+        return None if self.queue is None else self.queue.stats()
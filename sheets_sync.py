@@ -0,0 +1,271 @@
+import math
+import re
+
+import gspread
+import pandas as pd
+from gspread.utils import numericise_all, rowcol_to_a1
+
+from metrics import count, span
+from payments import PAYMENT_COLUMNS
+from storage import COLUMNS, coerce_ledger
+
+# Hidden worksheet holding the change-detection formulas
+SYNC_SHEET = "Sync"
+
+# Data rows per fingerprinted chunk; an edit anywhere in a chunk refetches the whole chunk
+SYNC_CHUNK_ROWS = 500
+
+# Fingerprints are kept this many chunks ahead of the data, so appends rarely need new formulas
+SYNC_HEADROOM_CHUNKS = 10
+
+# Leading characters of each cell that are fingerprinted one by one (the length covers the rest)
+FINGERPRINT_CHARS = 24
+FINGERPRINT_WEIGHTS = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89]
+
+# Reload everything instead once more than this share of a worksheet's chunks changed
+SYNC_MAX_CHANGED = 0.5
+
+
+def column_letter(col):
+    return re.sub(r"\d", "", rowcol_to_a1(1, col))
+
+
+def sheet_range(title, first_row, last_row, width):
+    return "'{}'!A{}:{}{}".format(title.replace("'", "''"), first_row, column_letter(width), last_row)
+
+
+# Sheets formula giving one number per chunk of rows that changes when any cell in it
+# does: every one of the first FINGERPRINT_CHARS characters and the length of each
+# cell, weighted by the cell's place in the chunk. Worked out by Sheets itself, so
+# checking a chunk costs one cell on the wire instead of SYNC_CHUNK_ROWS rows.
+def fingerprint_formula(title, first_row, last_row, width):
+    chars = "+".join(
+        f"SUMPRODUCT(IFERROR(UNICODE(MID(r,{i + 1},1)),0)*w)*{weight}"
+        for i, weight in enumerate(FINGERPRINT_WEIGHTS[:FINGERPRINT_CHARS])
+    )
+    return (f"=LET(r,{sheet_range(title, first_row, last_row, width)},"
+            f"w,(ROW(r)-{first_row - 1})*COLUMN(r),SUMPRODUCT(LEN(r)*w)+{chars})")
+
+
+def count_formula(title):
+    return "=COUNTA('{}'!A:A)".format(title.replace("'", "''"))
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# One worksheet kept in step by SheetsSync: its title, width, column of the Sync sheet
+# and what was last seen of it
+class TrackedSheet:
+    def __init__(self, worksheet, columns, sync_column):
+        self.worksheet = worksheet
+        self.columns = columns
+        self.sync_column = sync_column
+        self.rows = 0
+        self.fingerprints = []
+
+    @property
+    def title(self):
+        return self.worksheet.title
+
+    def chunk_ranges(self, chunks, rows):
+        # Row 1 is the header, so chunk i holds sheet rows 2 + i * SYNC_CHUNK_ROWS onwards
+        return [
+            f"A{2 + i * SYNC_CHUNK_ROWS}:{column_letter(len(self.columns))}{min(1 + (i + 1) * SYNC_CHUNK_ROWS, rows + 1)}"
+            for i in chunks
+        ]
+
+    # Fetch the given chunks (one batch_get) as {data row position: cell values}
+    def fetch(self, chunks, rows):
+        fetched = {}
+        if not chunks:
+            return fetched
+        for i, values in zip(chunks, self.worksheet.batch_get(self.chunk_ranges(chunks, rows))):
+            first = i * SYNC_CHUNK_ROWS
+            for offset in range(min(SYNC_CHUNK_ROWS, rows - first)):
+                cells = list(values[offset]) if offset < len(values) else []
+                # Numbers as numbers, like get_all_records() gives them
+                fetched[first + offset] = numericise_all((cells + [""] * len(self.columns))[:len(self.columns)])
+        return fetched
+
+
+# Delta sync for SheetsStorage. A hidden "Sync" worksheet holds a row count and one
+# fingerprint formula per SYNC_CHUNK_ROWS rows of the ledger and Payments worksheets.
+# changes() first asks Drive for the spreadsheet's modified time (a few hundred bytes);
+# only if it moved are the fingerprints read (one small batch_get), and only the chunks
+# whose fingerprint changed are fetched. Rows that were deleted, moved or renumbered
+# can't be merged by receipt, so those mean a full reload.
+# Everything rests on the formula moving when a cell does, so our own writes are used
+# to check it: a chunk we changed that comes back with the same fingerprint means a full
+# reload, and no more delta syncs for this process.
+class SheetsSync:
+    def __init__(self, storage):
+        self.storage = storage
+        self.spreadsheet = storage.spreadsheet
+        self.sync_sheet = None
+        self.ledger = TrackedSheet(storage.sheet, COLUMNS, 1)
+        self.payments = None
+        self.modified = None
+        # Receipt No. of every ledger row, in sheet order
+        self.receipts = []
+        # The Payments worksheet as last read, without queued payments
+        self.payment_rows = None
+        # Ledger chunks we wrote to since the fingerprints were last read. Their
+        # fingerprints must come back changed; if one doesn't, the formula isn't seeing
+        # edits in this sheet, and delta sync is turned off (broken) for good.
+        self.written = set()
+        self.broken = False
+
+    def last_update_time(self):
+        count("sheets.api_calls")
+        with span("sheets.get_lastUpdateTime"):
+            return self.spreadsheet.get_lastUpdateTime()
+
+    def get_sync_sheet(self):
+        if self.sync_sheet is None:
+            from sheets_storage import InstrumentedWorksheet
+            try:
+                worksheet = self.spreadsheet.worksheet(SYNC_SHEET)
+            except gspread.WorksheetNotFound:
+                try:
+                    worksheet = self.spreadsheet.add_worksheet(SYNC_SHEET, rows=1000, cols=2)
+                    worksheet.hide()
+                except gspread.exceptions.APIError:
+                    # Another process added it first
+                    worksheet = self.spreadsheet.worksheet(SYNC_SHEET)
+            self.sync_sheet = InstrumentedWorksheet(worksheet)
+        return self.sync_sheet
+
+    def tracked(self):
+        return [sheet for sheet in (self.ledger, self.payments) if sheet is not None]
+
+    # Row counts and fingerprints of the tracked worksheets, adding formulas for any
+    # chunks not covered yet. The Sync sheet is a few hundred cells, so it is read whole.
+    def read_fingerprints(self):
+        sync_sheet = self.get_sync_sheet()
+        # On a new Sync sheet the row counts are only known once their formulas are in
+        for _ in range(3):
+            values = sync_sheet.batch_get(["A:B"], value_render_option="UNFORMATTED_VALUE")[0]
+            values = [list(row) + [""] * (2 - len(row)) for row in values] or [["", ""]]
+            columns = {sheet.title: [number(row[sheet.sync_column - 1]) for row in values] for sheet in self.tracked()}
+            rows = {title: None if column[0] is None else int(column[0]) - 1 for title, column in columns.items()}
+            missing = []
+            for sheet in self.tracked():
+                chunks = math.ceil(max(rows[sheet.title] or 0, 0) / SYNC_CHUNK_ROWS)
+                covered = next((i for i, value in enumerate(columns[sheet.title][1:]) if value is None), len(values) - 1)
+                if rows[sheet.title] is None or covered < chunks:
+                    missing.append((sheet, chunks + SYNC_HEADROOM_CHUNKS))
+            if not missing:
+                fingerprints = {
+                    title: column[1:1 + math.ceil(max(rows[title], 0) / SYNC_CHUNK_ROWS)] for title, column in columns.items()
+                }
+                return rows, fingerprints
+            self.write_formulas(missing)
+        raise RuntimeError(f"The {SYNC_SHEET} worksheet's formulas did not evaluate")
+
+    def write_formulas(self, missing):
+        data = []
+        for sheet, chunks in missing:
+            col = column_letter(sheet.sync_column)
+            formulas = [[count_formula(sheet.title)]] + [
+                [fingerprint_formula(sheet.title, 2 + i * SYNC_CHUNK_ROWS, 1 + (i + 1) * SYNC_CHUNK_ROWS, len(sheet.columns))]
+                for i in range(chunks)
+            ]
+            data.append({"range": f"{col}1:{col}{chunks + 1}", "values": formulas})
+        self.get_sync_sheet().batch_update(data, value_input_option="USER_ENTERED")
+
+    # Note the modified time and fingerprints before a full load reads the data, so
+    # anything edited while it loads shows up as a change next time
+    def checkpoint(self):
+        if self.broken:
+            return
+        payments_sheet = self.storage.get_payments_sheet()
+        self.payments = None if payments_sheet is None else TrackedSheet(payments_sheet, PAYMENT_COLUMNS, 2)
+        self.modified = self.last_update_time()
+        rows, fingerprints = self.read_fingerprints()
+        for sheet in self.tracked():
+            sheet.rows, sheet.fingerprints = rows[sheet.title], fingerprints[sheet.title]
+        self.written = set()
+
+    # Ledger rows (data row positions) we just changed in the sheet. Called after the write,
+    # under the same lock as changes(), so the next fingerprints read is the first to see it.
+    def wrote(self, positions):
+        self.written.update(position // SYNC_CHUNK_ROWS for position in positions)
+
+    # What the full load read from the sheet, before queued writes were laid over it
+    def loaded(self, df):
+        self.receipts = df["Receipt No."].astype(str).tolist()
+
+    def loaded_payments(self, payments):
+        self.payment_rows = payments
+
+    def changed_chunks(self, sheet, rows, fingerprints):
+        if rows < sheet.rows:
+            return None
+        changed = [
+            i for i, fingerprint in enumerate(fingerprints)
+            if i >= len(sheet.fingerprints) or fingerprint != sheet.fingerprints[i]
+        ]
+        if len(changed) > 1 and len(changed) > SYNC_MAX_CHANGED * len(fingerprints):
+            return None
+        return changed
+
+    # Ledger rows changed or added since the last load or changes() call, and the whole
+    # payments table if it changed:
+    #   {"rows": coerced DataFrame (queued updates applied), "positions": their rows in
+    #    sheet order, "payments": DataFrame or None}
+    # None means this can't be told from the fingerprints, so reload everything.
+    def changes(self):
+        if self.broken:
+            return None
+        with span("sheets.sync") as fields:
+            modified = self.last_update_time()
+            if modified == self.modified:
+                fields["changed"] = 0
+                return {"rows": coerce_ledger(pd.DataFrame(columns=COLUMNS)), "positions": [], "payments": None}
+            if self.payments is None and self.storage.get_payments_sheet() is not None:
+                # The payments table was created since the load
+                return None
+            rows, fingerprints = self.read_fingerprints()
+            changed = {sheet.title: self.changed_chunks(sheet, rows[sheet.title], fingerprints[sheet.title])
+                       for sheet in self.tracked()}
+            if any(chunks is None for chunks in changed.values()):
+                return None
+            missed = {i for i in self.written if i < len(self.ledger.fingerprints)} - set(changed[self.ledger.title])
+            self.written = set()
+            if missed:
+                count("sheets.sync_fingerprint_misses")
+                self.broken = True
+                return None
+
+            ledger_rows = self.ledger.fetch(changed[self.ledger.title], rows[self.ledger.title])
+            for position in sorted(ledger_rows):
+                if position < len(self.receipts) and str(ledger_rows[position][0]) != self.receipts[position]:
+                    # A row was deleted, moved or renumbered
+                    return None
+            self.receipts += [str(ledger_rows[position][0]) for position in sorted(ledger_rows) if position >= len(self.receipts)]
+
+            payments = None
+            if self.payments is not None and changed[self.payments.title]:
+                payment_rows = self.payments.fetch(changed[self.payments.title], rows[self.payments.title])
+                known = [] if self.payment_rows is None else self.payment_rows.values.tolist()
+                for position in sorted(payment_rows):
+                    if position < len(known):
+                        known[position] = payment_rows[position]
+                    else:
+                        known.append(payment_rows[position])
+                self.payment_rows = pd.DataFrame(known, columns=PAYMENT_COLUMNS)
+                payments = self.payment_rows
+
+            self.modified = modified
+            for sheet in self.tracked():
+                sheet.rows, sheet.fingerprints = rows[sheet.title], fingerprints[sheet.title]
+            positions = sorted(ledger_rows)
+            df = coerce_ledger(pd.DataFrame([ledger_rows[position] for position in positions], columns=COLUMNS))
+            fields["changed"] = len(df)
+            count("sheets.sync_rows", len(df))
+            return {"rows": df, "positions": positions, "payments": payments}
@@ -0,0 +1,87 @@
+# Cold start timing report for the billing app.
+# Each run starts a fresh Python process and times the steps a new Streamlit worker goes
+# through: importing the app, building the storage, loading the ledger and rendering the
+# first receipt. It also records whether reportlab/gspread were imported before they were needed.
+#
+#   python startup_report.py                      # storage from BILLS_STORAGE, default sqlite
+#   python startup_report.py --storage excel --runs 10 --json startup.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+STEPS = ["import_app", "build_storage", "load_ledger", "first_receipt"]
+
+# Runs inside the child process; prints one JSON line of step timings in milliseconds
+CHILD = r"""
+import json, sys, time
+timings = {}
+start = time.perf_counter()
+import billing_app
+timings["import_app"] = time.perf_counter() - start
+loaded_at_import = {name: name in sys.modules for name in ("reportlab", "gspread")}
+
+from storage import get_storage
+start = time.perf_counter()
+storage = get_storage(sys.argv[1])
+timings["build_storage"] = time.perf_counter() - start
+
+start = time.perf_counter()
+df = storage.load()
+timings["load_ledger"] = time.perf_counter() - start
+
+from receipts import build_receipt_pdf
+start = time.perf_counter()
+if len(df):
+    build_receipt_pdf(df.iloc[0])
+timings["first_receipt"] = time.perf_counter() - start
+
+print(json.dumps({
+    "ms": {step: seconds * 1000 for step, seconds in timings.items()},
+    "loaded_at_import": loaded_at_import,
+}))
+"""
+
+
+def run_once(storage):
+    result = subprocess.run([sys.executable, "-c", CHILD, storage], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the billing app's cold start")
+    parser.add_argument("--storage", default=os.environ.get("BILLS_STORAGE", "sqlite"), choices=["excel", "sqlite", "sheets"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    runs = [run_once(args.storage) for _ in range(args.runs)]
+    report = {
+        "storage": args.storage,
+        "runs": args.runs,
+        "median_ms": {step: statistics.median(run["ms"][step] for run in runs) for step in STEPS},
+        "max_ms": {step: max(run["ms"][step] for run in runs) for step in STEPS},
+        "loaded_at_import": runs[0]["loaded_at_import"],
+    }
+
+    print(f"Cold start, {args.storage} storage, {args.runs} runs")
+    print(f"{'step':<16}{'median ms':>12}{'max ms':>12}")
+    for step in STEPS:
+        print(f"{step:<16}{report['median_ms'][step]:>12.1f}{report['max_ms'][step]:>12.1f}")
+    total = sum(report["median_ms"][step] for step in STEPS[:3])
+    print(f"Time to first page (import + storage + ledger): {total:.1f} ms")
+    for name, loaded in report["loaded_at_import"].items():
+        print(f"{name} imported with the app: {'yes' if loaded else 'no'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
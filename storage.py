@@ -0,0 +1,301 @@
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from metrics import count, span
+from payments import PAYMENT_COLUMNS
+
+# Columns of the billing ledger, in sheet/workbook order
+COLUMNS = [
+    "Receipt No.", "Customer Name", "College", "Phone No.", "Project Title", "Reference", "Date", "Total Cost",
+    "1st Payment Date", "1st Payment Amount", "1st Payment Method",
+    "2nd Payment Date", "2nd Payment Amount", "2nd Payment Method",
+    "3rd Payment Date", "3rd Payment Amount", "3rd Payment Method",
+    "Deduction Amount", "Total Paid", "Balance"
+]
+DATE_COLUMNS = ["Date", "1st Payment Date", "2nd Payment Date", "3rd Payment Date"]
+AMOUNT_COLUMNS = ["Total Cost", "1st Payment Amount", "2nd Payment Amount", "3rd Payment Amount", "Deduction Amount", "Total Paid", "Balance"]
+
+# Sheet/worksheet holding the payments table, next to the ledger
+PAYMENTS_SHEET = "Payments"
+
+# Backends that can be picked with the BILLS_STORAGE environment variable
+STORAGE_BACKENDS = ["sheets", "excel", "sqlite"]
+
+# How long a writer waits for the workbook lock, and when a lock file is old enough
+# to have been left behind by a crashed process
+EXCEL_LOCK_TIMEOUT = 30
+EXCEL_LOCK_STALE = 120
+
+
+# Raised by update() when a row no longer holds the values the caller read, i.e. another
+# session wrote it in between. Reload and compute the change again.
+class WriteConflict(Exception):
+    pass
+
+
+# Whether a ledger value is empty: None, NaN, NaT or pd.NA. Strings never are, not even "".
+def is_missing(value):
+    return value is None or (not isinstance(value, str) and pd.isna(value))
+
+
+# Bring a raw ledger (from any backend) to the shape the app expects:
+# all COLUMNS in order, dates as date objects and amounts as floats
+def coerce_ledger(df):
+    with span("coerce_ledger", rows=len(df)):
+        df = df.reindex(columns=COLUMNS)
+        for date_col in DATE_COLUMNS:
+            df[date_col] = pd.to_datetime(df[date_col], errors='coerce').dt.date
+        for col in AMOUNT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+        return df
+
+
+# Whether a stored ledger value still equals the value a caller read (5, 5.0 and "5" agree)
+def same_value(stored, expected):
+    def empty(value):
+        return is_missing(value) or value == ""
+    if empty(stored) or empty(expected):
+        return empty(stored) and empty(expected)
+    try:
+        return abs(float(stored) - float(expected)) < 0.005
+    except (TypeError, ValueError):
+        return str(stored) == str(expected)
+
+
+# Compare-and-swap check: raise WriteConflict unless row (as just read from storage)
+# is still receipt_no and still holds every expected value
+def check_expected(row, receipt_no, expected):
+    if str(row["Receipt No."]) != str(receipt_no):
+        raise WriteConflict(f"Receipt No. {receipt_no} has moved")
+    for col, value in (expected or {}).items():
+        if not same_value(row[col], value):
+            raise WriteConflict(f"Receipt No. {receipt_no} was changed by someone else ({col})")
+
+
+# Common interface of the ledger backends. Each backend persists the same 20 COLUMNS;
+# callers never need to know whether that is a workbook, a Google Sheet or SQLite.
+class Storage:
+    name = "storage"
+
+    # Whole ledger as a DataFrame, in storage order
+    def load(self):
+        raise NotImplementedError
+
+    # One receipt's row as a Series, or None. Backends without a better lookup scan a fresh load.
+    def get(self, receipt_no):
+        df = self.load()
+        matches = df[df["Receipt No."].astype(str) == str(receipt_no)]
+        return None if matches.empty else matches.iloc[0]
+
+    # Save a new bill. Returns the bill's position in storage order when the backend
+    # knows it (so a cached copy can check it is still in step), otherwise None.
+    def insert(self, entry):
+        raise NotImplementedError
+
+    # Save many new bills in one batched write. Returns the first one's position, like insert().
+    def insert_many(self, entries):
+        raise NotImplementedError
+
+    # Write the changed cells of one existing receipt. position is the receipt's
+    # row in the last load, for backends that address rows by number. expected maps
+    # columns to the values the changes were computed from; if the stored row differs,
+    # nothing is written and WriteConflict is raised. intent describes the change (see
+    # payments.receipt_changes) for backends that write later and may have to redo it.
+    def update(self, receipt_no, changes, position=None, expected=None, intent=None):
+        raise NotImplementedError
+
+    # The payments table (PAYMENT_COLUMNS, in the order payments were made), or None
+    # if this store has none yet and payments only exist in the ledger's slot columns
+    def load_payments(self):
+        return None
+
+    # Append payments (dicts with PAYMENT_COLUMNS keys) to the payments table, creating it if needed
+    def insert_payments(self, payments):
+        raise NotImplementedError
+
+    # Carry payments read from the ledger's slot columns over to a new payments table,
+    # unless someone else carried them over first. Returns False if they had.
+    # Backends that write later skip them at send time instead and return True.
+    def migrate_payments(self, payments):
+        existing = self.load_payments()
+        if existing is not None and not existing.empty:
+            return False
+        self.insert_payments(payments)
+        return True
+
+    # Rows edited or added by others since the last load(), for backends that can tell
+    # without reading everything: {"rows": changed/new rows in the load() layout,
+    # "positions": each row's position in load() order, "payments": the whole payments
+    # table if it changed, else None}. None means the
+    # backend can't tell, so the whole ledger has to be loaded again.
+    def changes(self):
+        return None
+
+    # Bumped whenever the backend writes something other than what its callers were told
+    # (a queued update redone against a newer row), so a cached copy knows to reload
+    def revision(self):
+        return 0
+
+    # Depth and health of the background write queue, for backends that have one
+    def queue_stats(self):
+        return None
+
+    # Write the whole ledger (and the payments table, if any) to an .xlsx file for the accountants
+    def export_excel(self, excel_file):
+        payments = self.load_payments()
+        with pd.ExcelWriter(excel_file) as writer:
+            self.load().to_excel(writer, index=False, sheet_name="Sheet1")
+            if payments is not None:
+                payments.to_excel(writer, index=False, sheet_name=PAYMENTS_SHEET)
+
+
+# The original hug.py storage: the whole ledger lives in one workbook, so every
+# write rewrites the file. Writes re-read the workbook under a lock file, so two
+# processes never overwrite each other's rows. Kept for small installs and for
+# benchmarking the others.
+class ExcelStorage(Storage):
+    name = "excel"
+
+    def __init__(self, excel_file):
+        self.excel_file = excel_file
+        self.lock_file = excel_file + ".lock"
+        if not os.path.exists(excel_file):
+            pd.DataFrame(columns=COLUMNS).to_excel(excel_file, index=False)
+
+    # Hold the workbook's lock file for one read-modify-write
+    @contextmanager
+    def locked(self):
+        deadline = time.monotonic() + EXCEL_LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_file) > EXCEL_LOCK_STALE:
+                        os.remove(self.lock_file)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{self.excel_file} is locked by another writer")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(self.lock_file)
+
+    def load(self):
+        with span("excel.read_excel"):
+            df = pd.read_excel(self.excel_file)
+        return coerce_ledger(df)
+
+    def load_payments(self):
+        with pd.ExcelFile(self.excel_file) as workbook:
+            if PAYMENTS_SHEET not in workbook.sheet_names:
+                return None
+            return pd.read_excel(workbook, sheet_name=PAYMENTS_SHEET)
+
+    # Rewrite the workbook, keeping the payments sheet unless new payments are given.
+    # The new file replaces the old one in one step, so readers never see half a workbook.
+    def write(self, df, payments=None):
+        if payments is None:
+            payments = self.load_payments()
+        root, ext = os.path.splitext(self.excel_file)
+        tmp_file = f"{root}.writing{ext}"
+        with span("excel.to_excel", rows=len(df)):
+            with pd.ExcelWriter(tmp_file) as writer:
+                df.to_excel(writer, index=False, sheet_name="Sheet1")
+                if payments is not None:
+                    payments.to_excel(writer, index=False, sheet_name=PAYMENTS_SHEET)
+        count("excel.bytes_written", os.path.getsize(tmp_file))
+        os.replace(tmp_file, self.excel_file)
+
+    def insert(self, entry):
+        with self.locked():
+            df = self.load()
+            position = len(df)
+            new_row = pd.DataFrame([entry], columns=COLUMNS)
+            df = new_row if df.empty else pd.concat([df, new_row], ignore_index=True)
+            self.write(df)
+            return position
+
+    def insert_many(self, entries):
+        with self.locked():
+            df = self.load()
+            position = len(df)
+            new_rows = pd.DataFrame(entries, columns=COLUMNS)
+            df = new_rows if df.empty else pd.concat([df, new_rows], ignore_index=True)
+            self.write(df)
+            return position
+
+    def insert_payments(self, payments):
+        with self.locked():
+            self.append_payments(self.load_payments(), payments)
+
+    # The check for a payments sheet and the carry-over share one hold of the lock file
+    def migrate_payments(self, payments):
+        with self.locked():
+            existing = self.load_payments()
+            if existing is not None and not existing.empty:
+                return False
+            self.append_payments(existing, payments)
+            return True
+
+    # Caller holds the lock file
+    def append_payments(self, existing, payments):
+        new_rows = pd.DataFrame(payments, columns=PAYMENT_COLUMNS)
+        if existing is not None and not existing.empty:
+            new_rows = pd.concat([existing, new_rows], ignore_index=True)
+        self.write(self.load(), new_rows)
+
+    def update(self, receipt_no, changes, position=None, expected=None, intent=None):
+        with self.locked():
+            df = self.load()
+            if position is None or position >= len(df) or str(df.at[position, "Receipt No."]) != str(receipt_no):
+                matches = df.index[df["Receipt No."].astype(str) == str(receipt_no)]
+                if len(matches) == 0:
+                    raise KeyError(f"Receipt No. {receipt_no} not found")
+                position = matches[0]
+            check_expected(df.loc[position], receipt_no, expected)
+            for col, value in changes.items():
+                if df[col].dtype != object:
+                    df[col] = df[col].astype(object)
+                df.at[position, col] = value
+            self.write(df)
+
+    def export_excel(self, excel_file):
+        if os.path.abspath(excel_file) != os.path.abspath(self.excel_file):
+            super().export_excel(excel_file)
+
+
+# Build the backend picked by config (BILLS_STORAGE, or the app's default).
+# Backends are imported lazily so an Excel-only install doesn't need gspread.
+def get_storage(default="sheets"):
+    backend = os.environ.get("BILLS_STORAGE", default).strip().lower()
+    if backend == "excel":
+        return ExcelStorage(os.environ.get("BILLS_EXCEL_FILE", "billing_data.xlsx"))
+    if backend == "sqlite":
+        from ledger_store import LedgerStore
+        store = LedgerStore(os.environ.get("BILLS_DB_FILE", "billing_data.db"))
+        store.import_excel(os.environ.get("BILLS_EXCEL_FILE", "billing_data.xlsx"))
+        return store
+    if backend == "sheets":
+        from sheets_storage import SheetsStorage, open_spreadsheet
+        # Writes are queued in the background unless SHEETS_WRITE_BEHIND=0
+        write_behind = os.environ.get("SHEETS_WRITE_BEHIND", "1") != "0"
+        # SHEETS_SYNC=delta refreshes the ledger from changed rows only (adds a hidden Sync worksheet)
+        delta_sync = os.environ.get("SHEETS_SYNC", "full").strip().lower() == "delta"
+        return SheetsStorage(
+            open_spreadsheet(
+                os.environ.get("BILLS_SPREADSHEET_ID", "1RXaCzBWbjGtFNEc963e6k6l7r1Ee6U4iK5ih5Syzp7U"),
+                os.environ.get("BILLS_SERVICE_ACCOUNT_FILE", "service_account.json"),
+            ),
+            queue_file=os.environ.get("SHEETS_QUEUE_FILE", ".sheets_queue.jsonl") if write_behind else None,
+            delta_sync=delta_sync,
+        )
+    raise ValueError(f"Unknown storage backend {backend!r}, expected one of {STORAGE_BACKENDS}")
@@ -0,0 +1,32 @@
+# Synthetic ledgers following COLUMNS, for the benchmark and memory reports
+import numpy as np
+import pandas as pd
+
+from storage import COLUMNS, coerce_ledger
+
+
+# A ledger shaped like the real one: few colleges/references/methods, unique receipts and phones
+def synthetic_ledger(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    colleges = [f"College {i}" for i in range(40)]
+    references = [f"Ref {i}" for i in range(25)] + [""]
+    dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 900, rows), unit="D")
+    cost = rng.integers(20, 200, rows) * 100.0
+    paid = np.minimum(cost, rng.integers(0, 150, rows) * 100.0)
+    df = pd.DataFrame({
+        "Receipt No.": [str(1000 + i) for i in range(rows)],
+        "Customer Name": [f"Customer {i}" for i in range(rows)],
+        "College": rng.choice(colleges, rows),
+        "Phone No.": [str(9000000000 + i) for i in range(rows)],
+        "Project Title": [f"Project {i % 3000}" for i in range(rows)],
+        "Reference": rng.choice(references, rows),
+        "Date": dates,
+        "Total Cost": cost,
+        "1st Payment Date": dates,
+        "1st Payment Amount": paid,
+        "1st Payment Method": rng.choice(["GPay", "Cash"], rows),
+        "Deduction Amount": 0.0,
+        "Total Paid": paid,
+        "Balance": cost - paid,
+    }, columns=COLUMNS)
+    return coerce_ledger(df)
@@ -0,0 +1,60 @@
+# Validation of bulk-imported bills (bill_import.py)
+import io
+
+import pandas as pd
+import pytest
+
+from bill_import import validate_file
+from receipt_index import ReceiptIndex
+
+
+def csv_file(text):
+    return io.BytesIO(text.encode())
+
+
+def errors_by_row(errors):
+    return {row: sorted(group["Error"]) for row, group in errors.groupby("Row")}
+
+
+def test_duplicates_within_and_across_chunks_and_existing_receipts():
+    source = csv_file("Receipt No.,Total Cost\n1,100\n2,100\n1,100\n3,100\n2,100\n9,100\n")
+    valid, errors = validate_file(source, "bills.csv", ReceiptIndex(["9"]), chunk_rows=2)
+    assert valid["Receipt No."].tolist() == ["1", "2", "3"]
+    assert errors_by_row(errors) == {
+        4: ["Receipt No. appears more than once in the file"],
+        6: ["Receipt No. appears more than once in the file"],
+        7: ["Receipt No. already exists"],
+    }
+
+
+def test_bad_values_are_reported_per_row():
+    source = csv_file("Receipt No.,Date,Total Cost\n,2025-01-01,100\n2,not a date,100\n3,2025-01-01,lots\n4,,100\n")
+    valid, errors = validate_file(source, "bills.csv", ReceiptIndex())
+    assert valid["Receipt No."].tolist() == ["4"]
+    assert errors_by_row(errors) == {
+        2: ["Receipt No. is empty"],
+        3: ["Date is not a date"],
+        4: ["Total Cost is not a number"],
+    }
+
+
+def test_blank_totals_are_filled_and_wrong_balances_flagged():
+    source = csv_file("Receipt No.,Total Cost,1st Payment Amount,Deduction Amount,Total Paid,Balance\n"
+                      "1,1000,400,100,,\n2,1000,400,0,400,500\n")
+    valid, errors = validate_file(source, "bills.csv", ReceiptIndex())
+    assert valid[["Total Paid", "Balance"]].values.tolist() == [[400.0, 500.0]]
+    assert errors_by_row(errors) == {3: ["Balance is not Total Cost - Total Paid - Deduction Amount"]}
+
+
+def test_workbook_receipt_numbers_read_as_text():
+    source = io.BytesIO()
+    pd.DataFrame({"Receipt No.": [12, 13.0], "Total Cost": [100, 200]}).to_excel(source, index=False)
+    source.seek(0)
+    valid, errors = validate_file(source, "bills.xlsx", ReceiptIndex(["13"]))
+    assert valid["Receipt No."].tolist() == ["12"]
+    assert errors_by_row(errors) == {3: ["Receipt No. already exists"]}
+
+
+def test_missing_required_column():
+    with pytest.raises(ValueError, match="Total Cost"):
+        validate_file(csv_file("Receipt No.,Customer Name\n1,Asha\n"), "bills.csv", ReceiptIndex())
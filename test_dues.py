@@ -0,0 +1,50 @@
+# Incremental statements of dues.py on a SQLite ledger
+import datetime
+import os
+
+from dues import run_dues, statement_path
+
+TODAY = datetime.date(2025, 3, 1)
+PHONE = "9876543210"
+
+
+def bill(receipt_no, phone, cost):
+    return {"Receipt No.": receipt_no, "Customer Name": "Asha", "Phone No.": phone,
+            "Date": datetime.date(2025, 1, 1), "Total Cost": cost, "Total Paid": 0.0, "Balance": cost}
+
+
+def run(cache, tmp_path, today=TODAY):
+    return run_dues(cache, str(tmp_path / "out"), str(tmp_path / "state.json"), today=today, workers=1)
+
+
+def test_unchanged_dues_write_nothing(make_store, make_cache, tmp_path):
+    cache = make_cache(make_store([bill("A", PHONE, 100.0), bill("B", "9000000001", 200.0)]))
+    assert run(cache, tmp_path)["statements"] == 2
+    assert run(cache, tmp_path)["statements"] == 0
+
+
+def test_moving_to_the_next_ageing_bucket_rewrites_the_statement(make_store, make_cache, tmp_path):
+    cache = make_cache(make_store([bill("A", PHONE, 100.0)]))
+    run(cache, tmp_path)
+    # 2025-01-01 is 60 days before 2025-03-02 and 61 before 2025-03-03
+    assert run(cache, tmp_path, datetime.date(2025, 3, 2))["statements"] == 0
+    assert run(cache, tmp_path, datetime.date(2025, 3, 3))["statements"] == 1
+
+
+def test_paying_off_one_receipt_rewrites_the_statement(make_store, make_cache, tmp_path):
+    cache = make_cache(make_store([bill("A", PHONE, 100.0), bill("B", PHONE, 200.0)]))
+    run(cache, tmp_path)
+    cache.add_payment("A", datetime.date(2025, 2, 1), 100.0, "Cash")
+    summary = run(cache, tmp_path)
+    assert (summary["statements"], summary["removed"]) == (1, 0)
+    assert os.path.exists(statement_path(str(tmp_path / "out"), PHONE))
+
+
+def test_paying_off_everything_removes_the_statement(make_store, make_cache, tmp_path):
+    cache = make_cache(make_store([bill("A", PHONE, 100.0), bill("B", PHONE, 200.0)]))
+    run(cache, tmp_path)
+    cache.add_payment("A", datetime.date(2025, 2, 1), 100.0, "Cash")
+    cache.add_payment("B", datetime.date(2025, 2, 1), 200.0, "Cash")
+    summary = run(cache, tmp_path)
+    assert (summary["statements"], summary["removed"]) == (0, 1)
+    assert not os.path.exists(statement_path(str(tmp_path / "out"), PHONE))
@@ -0,0 +1,100 @@
+# Compare-and-swap updates of ledger_cache.LedgerCache.update_with on a SQLite ledger,
+# and the carry-over of slot payments when two sessions take the first payments
+import datetime
+import threading
+
+import pandas as pd
+import pytest
+
+import ledger_cache
+from storage import ExcelStorage, WriteConflict
+
+RECEIPT = "7"
+BILL = {"Receipt No.": RECEIPT, "Customer Name": "Asha", "Total Cost": 5000.0,
+        "Total Paid": 0.0, "Deduction Amount": 0.0, "Balance": 5000.0}
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    monkeypatch.setattr(ledger_cache.time, "sleep", lambda seconds: None)
+
+
+# Caches that are never refreshed by age, so each keeps serving the row it loaded
+@pytest.fixture
+def stale_cache(make_cache):
+    return lambda store: make_cache(store, ttl=3600)
+
+
+def test_stale_deduction_conflicts_and_retries(make_store, stale_cache):
+    store = make_store([BILL])
+    a = stale_cache(store)
+    b = stale_cache(store)
+    a.add_deduction(RECEIPT, 100.0)
+    b.add_deduction(RECEIPT, 50.0)
+
+    row = store.get(RECEIPT)
+    assert (row["Deduction Amount"], row["Balance"]) == (150.0, 4850.0)
+    assert b.find(RECEIPT)["Deduction Amount"] == 150.0
+
+
+def test_conflict_on_the_last_attempt_is_raised(make_store, stale_cache):
+    store = make_store([BILL])
+    a = stale_cache(store)
+    b = stale_cache(store)
+    a.update_with(RECEIPT, lambda row: {"Customer Name": "Asha R"}, reads=["Customer Name"])
+    with pytest.raises(WriteConflict):
+        b.update_with(RECEIPT, lambda row: {"Customer Name": "Asha K"}, reads=["Customer Name"], retries=0)
+    assert store.get(RECEIPT)["Customer Name"] == "Asha R"
+
+
+def test_write_does_not_hold_the_cache_lock(make_store, stale_cache, monkeypatch):
+    store = make_store([BILL])
+    cache = stale_cache(store)
+    update = store.update
+    others_got_in = []
+
+    def try_lock():
+        if cache.lock.acquire(timeout=1):
+            cache.lock.release()
+            others_got_in.append(True)
+
+    def slow_update(*args, **kwargs):
+        reader = threading.Thread(target=try_lock)
+        reader.start()
+        reader.join()
+        return update(*args, **kwargs)
+
+    monkeypatch.setattr(store, "update", slow_update)
+    cache.add_deduction(RECEIPT, 100.0)
+    assert others_got_in == [True]
+    assert cache.find(RECEIPT)["Deduction Amount"] == 100.0
+
+
+# Two sessions that loaded before the payments table existed both take a payment
+@pytest.mark.parametrize("backend", ["sqlite", "excel"])
+def test_slot_payments_carried_over_once(make_store, stale_cache, tmp_path, backend):
+    bill = {"Receipt No.": RECEIPT, "Customer Name": "Asha", "Total Cost": 5000.0,
+            "1st Payment Date": "2025-01-01", "1st Payment Amount": 2700.0, "1st Payment Method": "Cash",
+            "Total Paid": 2700.0, "Deduction Amount": 0.0, "Balance": 2300.0}
+    if backend == "sqlite":
+        store = make_store([bill])
+    else:
+        store = ExcelStorage(str(tmp_path / "ledger.xlsx"))
+        store.insert(bill)
+    a = stale_cache(store)
+    b = stale_cache(store)
+    a.add_payment(RECEIPT, datetime.date(2025, 2, 1), 100.0, "Cash")
+    b.add_payment(RECEIPT, datetime.date(2025, 2, 2), 50.0, "GPay")
+
+    assert store.load_payments()["Amount"].tolist() == [2700.0, 100.0, 50.0]
+    row = store.get(RECEIPT)
+    assert (row["Total Paid"], row["Balance"]) == (2850.0, 2150.0)
+
+
+def test_patch_leaves_a_frame_already_handed_out_alone(make_store, stale_cache):
+    cache = stale_cache(make_store([BILL]))
+    before = cache.get()
+    cache.update_with(RECEIPT, lambda row: {"Customer Name": "Asha R", "College": "New College"}, reads=["Customer Name"])
+    assert before.at[0, "Customer Name"] == "Asha"
+    assert pd.isna(before.at[0, "College"])
+    assert cache.find(RECEIPT)["College"] == "New College"
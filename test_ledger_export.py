@@ -0,0 +1,67 @@
+# Chunked ledger exports (ledger_export.py) read back and compared with the ledger
+import datetime
+import io
+
+import pandas as pd
+import pytest
+
+from ledger_export import WRITERS, export_bytes, export_chunks, export_positions
+from ledger_frame import compact_ledger
+from storage import COLUMNS, coerce_ledger
+
+
+def make_ledger(bills=7):
+    return compact_ledger(coerce_ledger(pd.DataFrame([
+        {"Receipt No.": str(i), "Customer Name": f"Customer {i}", "Date": datetime.date(2025, 1, 1 + i),
+         "College": f"College {i % 2}", "Reference": 12 if i == 0 else f"Ref {i}",
+         "Total Cost": 1000.5 + i, "Total Paid": 0.1 * i, "Balance": 1000.5 + i - 0.1 * i}
+        for i in range(bills)
+    ], columns=COLUMNS)))
+
+
+def export(ledger, positions, fmt, chunk_rows=3):
+    f = io.BytesIO()
+    WRITERS[fmt](export_chunks(ledger, positions, chunk_rows), f)
+    f.seek(0)
+    return f
+
+
+def read_back(f, fmt):
+    if fmt == "csv":
+        return pd.read_csv(f, dtype={"Receipt No.": str})
+    if fmt == "xlsx":
+        return pd.read_excel(f, dtype={"Receipt No.": str})
+    return pd.read_parquet(f)
+
+
+def test_filters():
+    ledger = make_ledger()
+    assert list(export_positions(ledger, start=datetime.date(2025, 1, 3), end=datetime.date(2025, 1, 5))) == [2, 3, 4]
+    assert list(export_positions(ledger, colleges=["College 1"])) == [1, 3, 5]
+    assert list(export_positions(ledger, start=datetime.date(2025, 1, 3), colleges=["College 0"])) == [2, 4, 6]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx", "parquet"])
+def test_chunks_add_up_to_the_selected_rows(fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    ledger = make_ledger()
+    positions = export_positions(ledger, colleges=["College 0"])
+    exported = read_back(export(ledger, positions, fmt), fmt)
+    assert exported.columns.tolist() == COLUMNS
+    assert exported["Receipt No."].tolist() == ["0", "2", "4", "6"]
+    assert exported["Total Paid"].tolist() == pytest.approx([0.0, 0.2, 0.4, 0.6])
+    assert str(exported.at[0, "Reference"]) == "12"
+    assert pd.to_datetime(exported["Date"]).dt.date.tolist()[-1] == datetime.date(2025, 1, 7)
+
+
+def test_parquet_row_group_per_chunk():
+    pq = pytest.importorskip("pyarrow.parquet")
+    ledger = make_ledger()
+    assert pq.ParquetFile(export(ledger, export_positions(ledger), "parquet")).num_row_groups == 3
+
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx"])
+def test_empty_export_keeps_the_header(fmt):
+    exported = read_back(io.BytesIO(export_bytes(make_ledger(), [], fmt)), fmt)
+    assert exported.columns.tolist() == COLUMNS and exported.empty
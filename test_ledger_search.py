@@ -0,0 +1,54 @@
+# Ledger search (ledger_search.py) and how the cached index follows new and edited bills
+import pandas as pd
+
+from ledger_frame import compact_ledger
+from ledger_search import LedgerSearch
+from storage import COLUMNS, coerce_ledger
+
+BILLS = [
+    {"Receipt No.": "1", "Customer Name": "Asha Rao", "Phone No.": "+91 98765 43210", "College": "City College"},
+    {"Receipt No.": "2", "Customer Name": "Ashok Kumar", "Phone No.": "9000000001", "College": "City College"},
+    {"Receipt No.": "3", "Customer Name": "Asha Menon", "Phone No.": "9000000002", "College": "Hill College"},
+]
+
+
+def make_search(bills=BILLS):
+    return LedgerSearch.from_frame(compact_ledger(coerce_ledger(pd.DataFrame(bills, columns=COLUMNS))))
+
+
+def test_whole_words_before_prefixes_newest_first():
+    search = make_search([*BILLS, {"Receipt No.": "4", "Customer Name": "Ash"}])
+    assert list(search.search("ash")) == [3, 2, 1, 0]
+    assert list(make_search().search("asha")) == [2, 0]
+
+
+def test_every_query_word_must_match():
+    assert list(make_search().search("asha city")) == [0]
+    assert list(make_search().search("asha nowhere")) == []
+
+
+def test_phone_numbers_match_on_digits():
+    search = make_search()
+    assert list(search.search("98765-43210")) == [0]
+    assert list(search.search("919876543210")) == [0]
+
+
+def test_one_typo_matches_longer_words_only():
+    search = make_search()
+    assert list(search.search("menno")) == [2]
+    assert list(search.search("menno", fuzzy=False)) == []
+    assert list(search.search("rai")) == []
+
+
+def test_empty_query_lists_every_bill_newest_first():
+    assert list(make_search().search("")) == [2, 1, 0]
+
+
+def test_cached_index_follows_new_and_edited_bills(make_store, make_cache):
+    cache = make_cache(make_store(BILLS), ttl=3600)
+    assert list(cache.search("ashok")[1]) == [1]
+
+    cache.insert({"Receipt No.": "4", "Customer Name": "Ravi Ashok", "Total Cost": 100.0})
+    cache.update_with("2", lambda row: {"Customer Name": "Kumar"}, reads=["Customer Name"])
+    assert list(cache.search("ashok")[1]) == [3]
+    assert list(cache.search("kumar")[1]) == [1]
@@ -0,0 +1,52 @@
+# The payments table (payments.py) and its migration from the ledger's slot columns
+import datetime
+
+import pandas as pd
+
+from payments import PaymentLedger, payments_from_slots
+from storage import COLUMNS, coerce_ledger
+
+
+def bill(receipt_no, *slots):
+    row = {"Receipt No.": receipt_no, "Total Cost": 1000.0}
+    for stage, (date, amount, method) in zip(["1st Payment", "2nd Payment", "3rd Payment"], slots):
+        row.update({f"{stage} Date": date, f"{stage} Amount": amount, f"{stage} Method": method})
+    return row
+
+
+def test_slot_payments_in_ledger_order():
+    ledger = coerce_ledger(pd.DataFrame([
+        bill("1", ("2025-01-01", 100.0, "Cash"), (None, 0.0, None), ("2025-01-03", 300.0, "GPay")),
+        bill("2", ("2025-01-02", 200.0, "Cash")),
+        # Only the first row of a duplicated receipt is read
+        bill("1", ("2025-01-04", 999.0, "Cash")),
+    ], columns=COLUMNS))
+    payments = payments_from_slots(ledger)
+    assert payments[["Receipt No.", "Amount", "Method"]].values.tolist() == [
+        ["1", 100.0, "Cash"], ["1", 300.0, "GPay"], ["2", 200.0, "Cash"]]
+    assert payments["Date"].tolist()[0] == datetime.date(2025, 1, 1)
+
+
+def test_fourth_payment_folds_into_the_third_slot():
+    ledger = PaymentLedger(pd.DataFrame({
+        "Receipt No.": "1", "Date": ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-04"],
+        "Amount": [100.0, 200.0, 0.1, 0.2], "Method": ["Cash", "Cash", "GPay", "Cheque"],
+    }))
+    changes = ledger.ledger_changes("1")
+    assert (changes["1st Payment Amount"], changes["2nd Payment Amount"]) == (100.0, 200.0)
+    assert (changes["3rd Payment Amount"], changes["3rd Payment Method"]) == (0.3, "GPay/Cheque")
+    assert changes["3rd Payment Date"] == datetime.date(2025, 1, 4)
+    assert changes["Total Paid"] == 300.3
+
+
+def test_first_payment_migrates_the_slot_payments(make_store, make_cache):
+    store = make_store([{**bill("1", ("2025-01-01", 100.0, "Cash"), ("2025-01-02", 200.0, "GPay")),
+                         "Total Paid": 300.0, "Balance": 700.0}])
+    cache = make_cache(store)
+    assert not cache.payments_for("1").empty and not cache.payments.migrated
+    assert store.load_payments().empty
+
+    cache.add_payment("1", datetime.date(2025, 2, 1), 300.0, "Cash")
+    assert store.load_payments()["Amount"].tolist() == [100.0, 200.0, 300.0]
+    row = store.get("1")
+    assert (row["3rd Payment Amount"], row["Total Paid"], row["Balance"]) == (300.0, 600.0, 400.0)
@@ -0,0 +1,145 @@
+# Two app processes writing to one sheet through their own write-behind queues,
+# played out on fake_sheets.FakeSpreadsheet. The queues' worker threads are held back
+# (WRITE_BATCH_DELAY), so each test decides when a queue flushes.
+import datetime
+
+import pandas as pd
+import pytest
+
+import sheets_queue
+from fake_sheets import FakeSpreadsheet
+from payments import PAYMENT_COLUMNS
+from storage import COLUMNS, PAYMENTS_SHEET
+
+RECEIPT = "7"
+
+
+@pytest.fixture(autouse=True)
+def manual_flush(monkeypatch):
+    monkeypatch.setattr(sheets_queue, "WRITE_BATCH_DELAY", 3600)
+
+
+def make_sheet(migrated=True):
+    bill = {
+        "Receipt No.": RECEIPT, "Customer Name": "Asha", "Phone No.": "9876543210", "Date": "2025-01-01",
+        "Total Cost": 5000, "1st Payment Date": "2025-01-01", "1st Payment Amount": 2700,
+        "1st Payment Method": "Cash", "Deduction Amount": 0, "Total Paid": 2700, "Balance": 2300,
+    }
+    spreadsheet = FakeSpreadsheet.from_ledger(pd.DataFrame([bill], columns=COLUMNS))
+    if migrated:
+        payments = spreadsheet.add_worksheet(PAYMENTS_SHEET, rows=1000, cols=len(PAYMENT_COLUMNS))
+        payments.rows = [list(PAYMENT_COLUMNS), [RECEIPT, "2025-01-01", 2700, "Cash"]]
+    return spreadsheet
+
+
+# One app process: a cache with its own queue file, that only reloads when told to
+@pytest.fixture
+def make_cache(make_sheets_cache):
+    return lambda spreadsheet, queue_file: make_sheets_cache(spreadsheet, ttl=3600, queue_file=str(queue_file))
+
+
+def sheet_row(spreadsheet, receipt_no=RECEIPT):
+    rows = spreadsheet.sheet1.get_all_records()
+    return next(row for row in rows if str(row["Receipt No."]) == receipt_no)
+
+
+def payment_total(spreadsheet):
+    return sum(float(row[2]) for row in spreadsheet.worksheet(PAYMENTS_SHEET).rows[1:])
+
+
+def test_concurrent_payments_both_count(make_cache, tmp_path):
+    spreadsheet = make_sheet()
+    a = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    b = make_cache(spreadsheet, tmp_path / "b.jsonl")
+    a.add_payment(RECEIPT, datetime.date(2025, 2, 1), 100.0, "Cash")
+    b.add_payment(RECEIPT, datetime.date(2025, 2, 2), 50.0, "GPay")
+    a.storage.queue.flush()
+    b.storage.queue.flush()
+
+    assert payment_total(spreadsheet) == 2850
+    assert sheet_row(spreadsheet)["Total Paid"] == 2850
+    assert sheet_row(spreadsheet)["Balance"] == 2150
+    assert b.storage.queue_stats()["conflicts"] == 0
+    # B was told 2750; the redone write makes it reload
+    assert not b.is_fresh()
+    assert b.find(RECEIPT)["Total Paid"] == 2850
+
+
+def test_concurrent_deductions_both_count(make_cache, tmp_path):
+    spreadsheet = make_sheet()
+    a = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    b = make_cache(spreadsheet, tmp_path / "b.jsonl")
+    a.add_deduction(RECEIPT, 100.0)
+    b.add_deduction(RECEIPT, 50.0)
+    a.storage.queue.flush()
+    b.storage.queue.flush()
+
+    assert sheet_row(spreadsheet)["Deduction Amount"] == 150
+    assert sheet_row(spreadsheet)["Balance"] == 2150
+    assert b.find(RECEIPT)["Deduction Amount"] == 150
+
+
+def test_slot_payments_carried_over_once(make_cache, tmp_path):
+    spreadsheet = make_sheet(migrated=False)
+    a = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    b = make_cache(spreadsheet, tmp_path / "b.jsonl")
+    a.add_payment(RECEIPT, datetime.date(2025, 2, 1), 100.0, "Cash")
+    b.add_payment(RECEIPT, datetime.date(2025, 2, 2), 50.0, "GPay")
+    a.storage.queue.flush()
+    b.storage.queue.flush()
+
+    assert payment_total(spreadsheet) == 2850
+    assert sheet_row(spreadsheet)["Total Paid"] == 2850
+    assert b.find(RECEIPT)["Total Paid"] == 2850
+
+
+def test_update_without_intent_conflicts_and_reloads(make_cache, tmp_path):
+    spreadsheet = make_sheet()
+    a = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    b = make_cache(spreadsheet, tmp_path / "b.jsonl")
+    a.update_with(RECEIPT, lambda row: {"Customer Name": "Asha R"}, reads=["Customer Name"])
+    b.update_with(RECEIPT, lambda row: {"Customer Name": "Asha K"}, reads=["Customer Name"])
+    a.storage.queue.flush()
+    b.storage.queue.flush()
+
+    assert sheet_row(spreadsheet)["Customer Name"] == "Asha R"
+    assert b.storage.queue_stats()["conflicts"] == 1
+    assert (tmp_path / "b.conflicts.jsonl").exists()
+    assert b.find(RECEIPT)["Customer Name"] == "Asha R"
+
+
+# The process dies after the sheet took the writes but before the queue file was rewritten
+def crash_after_send(queue, monkeypatch):
+    monkeypatch.setattr(queue, "done", lambda *args, **kwargs: None)
+    queue.flush()
+    monkeypatch.undo()
+
+
+def test_restart_does_not_resend_appends(make_cache, tmp_path, monkeypatch):
+    spreadsheet = make_sheet()
+    a = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    a.insert({"Receipt No.": "8", "Customer Name": "Ravi", "Total Cost": 900.0, "Balance": 900.0})
+    a.add_payment("8", datetime.date(2025, 2, 1), 100.0, "Cash")
+    crash_after_send(a.storage.queue, monkeypatch)
+
+    restarted = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    restarted.storage.queue.flush()
+    assert [str(row[0]) for row in spreadsheet.sheet1.rows[1:]] == [RECEIPT, "8"]
+    assert payment_total(spreadsheet) == 2800
+    assert sheet_row(spreadsheet, "8")["Total Paid"] == 100
+    assert restarted.storage.queue_stats()["depth"] == 0
+    # The reload after the flush no longer overlays the bill and payment a second time
+    assert len(restarted.get()) == 2
+    assert restarted.payments_for("8")["Amount"].tolist() == [100.0]
+
+
+def test_restart_does_not_redo_a_written_deduction(make_cache, tmp_path, monkeypatch):
+    spreadsheet = make_sheet()
+    a = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    a.add_deduction(RECEIPT, 100.0)
+    crash_after_send(a.storage.queue, monkeypatch)
+
+    restarted = make_cache(spreadsheet, tmp_path / "a.jsonl")
+    restarted.storage.queue.flush()
+    assert sheet_row(spreadsheet)["Deduction Amount"] == 100
+    assert sheet_row(spreadsheet)["Balance"] == 2200
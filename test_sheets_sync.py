@@ -0,0 +1,79 @@
+# Delta sync (sheets_sync.py) against fake_sheets.FakeSpreadsheet
+import pandas as pd
+
+import pytest
+
+from fake_sheets import FakeSpreadsheet
+from storage import COLUMNS
+
+
+def make_ledger(receipts):
+    return pd.DataFrame([
+        {"Receipt No.": receipt, "Customer Name": f"Customer {i}", "Date": "2025-01-01",
+         "Total Cost": 1000 * (i + 1), "Total Paid": 0, "Balance": 1000 * (i + 1)}
+        for i, receipt in enumerate(receipts)
+    ], columns=COLUMNS)
+
+
+@pytest.fixture
+def make_cache(make_sheets_cache):
+    return lambda spreadsheet: make_sheets_cache(spreadsheet, delta_sync=True)
+
+
+# Edit data row position (0-based) of the ledger worksheet, as someone in the sheet would
+def edit_cell(spreadsheet, position, col, value):
+    spreadsheet.sheet1.rows[position + 1][COLUMNS.index(col)] = value
+    spreadsheet.modified += 1
+
+
+def cached_values(cache, col):
+    return cache.get()[col].tolist()
+
+
+def test_edit_is_merged_without_a_full_load(make_cache):
+    spreadsheet = FakeSpreadsheet.from_ledger(make_ledger(["1", "2", "3"]))
+    cache = make_cache(spreadsheet)
+    edit_cell(spreadsheet, 1, "Customer Name", "Edited")
+    assert cached_values(cache, "Customer Name") == ["Customer 0", "Edited", "Customer 2"]
+    assert cache.full_loaded_at < cache.loaded_at
+
+
+def test_duplicated_receipt_patches_its_own_row(make_cache):
+    spreadsheet = FakeSpreadsheet.from_ledger(make_ledger(["111", "1", "1", "5"]))
+    cache = make_cache(spreadsheet)
+    edit_cell(spreadsheet, 2, "Customer Name", "Edited")
+    assert cached_values(cache, "Customer Name") == ["Customer 0", "Customer 1", "Edited", "Customer 3"]
+    # Amounts are paise in the cached layout
+    assert cached_values(cache, "Total Cost") == [100000, 200000, 300000, 400000]
+
+
+def test_deleted_row_forces_a_full_load(make_cache):
+    spreadsheet = FakeSpreadsheet.from_ledger(make_ledger(["1", "2", "3"]))
+    cache = make_cache(spreadsheet)
+    del spreadsheet.sheet1.rows[1]
+    spreadsheet.modified += 1
+    assert cached_values(cache, "Receipt No.") == ["2", "3"]
+    assert cache.full_loaded_at == cache.loaded_at
+
+
+def test_own_write_keeps_delta_sync_on(make_cache):
+    spreadsheet = FakeSpreadsheet.from_ledger(make_ledger(["1", "2", "3"]))
+    cache = make_cache(spreadsheet)
+    cache.add_deduction("2", 100.0)
+    edit_cell(spreadsheet, 0, "Customer Name", "Edited")
+    assert cached_values(cache, "Customer Name")[0] == "Edited"
+    assert not cache.storage.sync.broken
+
+
+# Fingerprints that never move, as if the formula missed edits: our own write gives it away
+def test_fingerprints_that_miss_our_write_turn_delta_sync_off(make_cache, monkeypatch):
+    evaluate = FakeSpreadsheet.evaluate
+    monkeypatch.setattr(FakeSpreadsheet, "evaluate", lambda self, value: (
+        evaluate(self, value) if not str(value).startswith("=LET(") else 42))
+    spreadsheet = FakeSpreadsheet.from_ledger(make_ledger(["1", "2", "3"]))
+    cache = make_cache(spreadsheet)
+    cache.add_deduction("2", 100.0)
+    edit_cell(spreadsheet, 0, "Customer Name", "Edited")
+    assert cached_values(cache, "Customer Name")[0] == "Edited"
+    assert cache.storage.sync.broken
+    assert cache.full_loaded_at == cache.loaded_at